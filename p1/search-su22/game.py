@@ -159,6 +159,16 @@ class AgentState:
     def getDirection(self):
         return self.configuration.getDirection()
 
+def cellCode(x, y):
+    """
+    A pseudo-random 64-bit code for cell (x, y).  A Grid's content hash is the
+    XOR of the codes of its True cells, so it changes by one XOR per cell.
+    """
+    z = (x * 0x9E3779B97F4A7C15 + y * 0xC2B2AE3D27D4EB4F + 1) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
 class Grid:
     """
     A 2-dimensional array of objects backed by a list of lists.  Data is accessed
@@ -176,6 +186,8 @@ class Grid:
         self.data = [[initialValue for y in range(height)] for x in range(width)]
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
+        self.contentHash = None
+        self.removedFrom = None
 
     def __getitem__(self, i):
         return self.data[i]
@@ -208,12 +220,46 @@ class Grid:
         g.data = [x[:] for x in self.data]
         return g
 
+    def copyWithout(self, x, y):
+        """
+        A copy with (x, y) set to False.  Its content hash is derived from
+        this grid's with one XOR, and removedFrom records (this grid's hash,
+        (x, y)) so that caches keyed on the hash can update their entry for
+        this grid rather than rebuild it.
+        """
+        g = self.copy()
+        g.data[x][y] = False
+        h = self.getContentHash()
+        g.contentHash = h
+        if self.data[x][y]:
+            g.contentHash = h ^ cellCode(x, y)
+            g.removedFrom = (h, (x, y))
+        return g
+
+    def getContentHash(self):
+        """
+        The XOR of cellCode over the True cells.  It is computed on first use
+        and carried through copyWithout and shallowCopy, so a grid must not be
+        changed in place once its hash has been asked for.
+        """
+        if self.contentHash == None:
+            h = 0
+            for x in range(self.width):
+                column = self.data[x]
+                for y in range(self.height):
+                    if column[y]:
+                        h ^= cellCode(x, y)
+            self.contentHash = h
+        return self.contentHash
+
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
         g = Grid(self.width, self.height)
         g.data = self.data
+        g.contentHash = self.contentHash
+        g.removedFrom = self.removedFrom
         return g
 
     def count(self, item =True ):
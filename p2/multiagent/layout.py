@@ -14,11 +14,18 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import Actions
+from game import Directions
 import os
 import random
-from functools import reduce
+import hashlib
+import threading
+import array
+import collections
+import heapq
 
 VISIBILITY_MATRIX_CACHE = {}
+PATHFINDER_CACHE = {}
 
 
 class Layout:
@@ -37,34 +44,40 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
-        # self.initializeVisibilityMatrix()
+        self.contentHash = None
+        self.visibility = None
 
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getContentHash(self):
+        """
+        A digest of the layout text, shared by every Layout built from it.
+        """
+        if self.contentHash == None:
+            text = "\n".join(self.layoutText)
+            self.contentHash = hashlib.sha1(text.encode()).hexdigest()
+        return self.contentHash
+
     def initializeVisibilityMatrix(self):
-        global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
-            from game import Directions
-            vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH,
-                    Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH: set(), Directions.SOUTH: set(
-            ), Directions.EAST: set(), Directions.WEST: set(), Directions.STOP: set()})
-            for x in range(self.width):
-                for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)]:
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(
-                str.__add__, self.layoutText)]
+        """
+        Attach the VisibilityIndex for this layout's walls, shared through
+        VISIBILITY_MATRIX_CACHE by all layouts with the same text.
+        """
+        key = self.getContentHash()
+        if key not in VISIBILITY_MATRIX_CACHE:
+            VISIBILITY_MATRIX_CACHE[key] = VisibilityIndex(self.walls)
+        self.visibility = VISIBILITY_MATRIX_CACHE[key]
+
+    def getPathfinder(self):
+        """
+        Return the Pathfinder for this layout's walls, shared through
+        PATHFINDER_CACHE by all layouts with the same text.
+        """
+        key = self.getContentHash()
+        if key not in PATHFINDER_CACHE:
+            PATHFINDER_CACHE[key] = Pathfinder(self.walls)
+        return PATHFINDER_CACHE[key]
 
     def isWall(self, pos):
         x, col = pos
@@ -90,8 +103,10 @@ class Layout:
         return pos
 
     def isVisibleFrom(self, ghostPos, pacPos, pacDirection):
+        if self.visibility == None:
+            self.initializeVisibilityMatrix()
         row, col = [int(x) for x in pacPos]
-        return ghostPos in self.visibility[row][col][pacDirection]
+        return self.visibility.isVisible(ghostPos, row, col, pacDirection)
 
     def __str__(self):
         return "\n".join(self.layoutText)
@@ -137,21 +152,353 @@ class Layout:
             self.numGhosts += 1
 
 
+class VisibilityIndex:
+    """
+    Stores, for every cell and direction, the distance to the first wall along
+    that direction.  Rays are cast on demand the first time a cell is queried
+    and every cell passed on the way is filled in as well, so a full index
+    costs one pass per row and column.  Pacman facing a direction sees every
+    position strictly between Pacman's cell and that wall.
+    """
+
+    def __init__(self, walls):
+        self.walls = walls
+        self.width = walls.width
+        self.height = walls.height
+        self.rays = {}
+        for direction in [Directions.NORTH, Directions.SOUTH,
+                          Directions.EAST, Directions.WEST]:
+            self.rays[direction] = array.array(
+                'i', [-1]) * (self.width * self.height)
+
+    def isOpen(self, x, y):
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return False
+        return not self.walls[x][y]
+
+    def rayLength(self, x, y, direction):
+        """
+        Return the number of steps from (x, y) to the first wall in direction
+        (0 for Directions.STOP).
+        """
+        if direction not in self.rays:
+            return 0
+        rays = self.rays[direction]
+        length = rays[x * self.height + y]
+        if length < 0:
+            dx, dy = Actions.directionToVector(direction)
+            dx, dy = int(dx), int(dy)
+            length = 1
+            while self.isOpen(x + dx * length, y + dy * length):
+                length += 1
+            for step in range(length):
+                rays[(x + dx * step) * self.height + y + dy * step] = length - step
+        return length
+
+    def isVisible(self, pos, x, y, direction):
+        """
+        Return whether pos lies on the ray cast from (x, y) in direction.
+        """
+        if direction not in self.rays:
+            return False
+        dx, dy = Actions.directionToVector(direction)
+        posX, posY = pos
+        if dx == 0 and posX != x:
+            return False
+        if dy == 0 and posY != y:
+            return False
+        offset = (posX - x) * dx + (posY - y) * dy
+        return 0 < offset < self.rayLength(x, y, direction)
+
+
+class Pathfinder:
+    """
+    Breadth-first search over the open cells of a walls Grid, shared by every
+    agent and module that needs maze distances or paths on the same board.
+
+    Single-source distance fields are cached for the most recent
+    maxDistanceFields sources asked about.
+    Multi-source fields over a set of targets (usually a food Grid) are keyed
+    on the targets' contents, so a field is reused until the targets change;
+    only the most recent maxTargetFields of them are kept.  A food Grid is
+    keyed on its content hash (Grid.getContentHash), which Pacman's rules keep
+    up to date in O(1) as food is eaten, and the field of the grid left after
+    eating is derived from the previous one by re-searching only the cells
+    whose nearest food disappeared.
+    """
+
+    def __init__(self, walls, maxTargetFields=16, maxDistanceFields=1024):
+        self.walls = walls
+        self.neighbors = {}
+        for x, y in walls.asList(False):
+            self.neighbors[(x, y)] = []
+            for direction in [Directions.NORTH, Directions.SOUTH,
+                              Directions.EAST, Directions.WEST]:
+                dx, dy = Actions.directionToVector(direction)
+                nextX, nextY = x + int(dx), y + int(dy)
+                if 0 <= nextX < walls.width and 0 <= nextY < walls.height \
+                        and not walls[nextX][nextY]:
+                    self.neighbors[(x, y)].append((direction, (nextX, nextY)))
+        self.distanceFields = collections.OrderedDict()
+        self.maxDistanceFields = maxDistanceFields
+        self.targetFields = collections.OrderedDict()
+        self.handedOn = collections.OrderedDict()
+        self.maxTargetFields = maxTargetFields
+        self.lock = threading.Lock()
+
+    def breadthFirst(self, sources):
+        """
+        Return a dict from every cell reachable from sources to a pair
+        (distance, nearest source).
+        """
+        return self.breadthFirstWithMembers(sources)[0]
+
+    def breadthFirstWithMembers(self, sources):
+        """
+        Like breadthFirst, but also return a dict from each source to the list
+        of cells it is nearest to.
+        """
+        field = {}
+        members = {}
+        queue = collections.deque()
+        for source in sources:
+            if source in self.neighbors and source not in field:
+                field[source] = (0, source)
+                members[source] = [source]
+                queue.append(source)
+        while queue:
+            cell = queue.popleft()
+            distance, origin = field[cell]
+            for direction, neighbor in self.neighbors[cell]:
+                if neighbor not in field:
+                    field[neighbor] = (distance + 1, origin)
+                    members[origin].append(neighbor)
+                    queue.append(neighbor)
+        return field, members
+
+    def getDistanceField(self, source):
+        """
+        Return a dict from every cell reachable from source to its maze
+        distance.
+        """
+        self.lock.acquire()
+        try:
+            if source in self.distanceFields:
+                self.distanceFields.move_to_end(source)
+                return self.distanceFields[source]
+        finally:
+            self.lock.release()
+        field = self.computeDistanceField(source)
+        self.lock.acquire()
+        try:
+            self.distanceFields[source] = field
+            while len(self.distanceFields) > self.maxDistanceFields:
+                self.distanceFields.popitem(last=False)
+        finally:
+            self.lock.release()
+        return field
+
+    def computeDistanceField(self, source):
+        """
+        Like getDistanceField, but always searches and does not cache the
+        result, for callers that build their own table of every field.
+        """
+        field = self.breadthFirst([source])
+        return dict([(cell, distance) for cell, (distance, origin) in field.items()])
+
+    def getDistance(self, pos1, pos2):
+        """
+        Return the maze distance between two open cells, or None if pos2
+        cannot be reached from pos1.
+        """
+        return self.getDistanceField(pos1).get(pos2)
+
+    def getPath(self, start, goal):
+        """
+        Return a shortest list of actions from start to goal, or None if goal
+        cannot be reached.
+        """
+        field = self.getDistanceField(goal)
+        if start not in field:
+            return None
+        return self.descend(start, lambda cell: field.get(cell))
+
+    def targetKey(self, targets):
+        if isinstance(targets, Grid):
+            return targets.getContentHash()
+        return frozenset(targets)
+
+    def removedTargets(self, oldKey, newKey):
+        """
+        Return the positions in oldKey but not in newKey, or None if newKey
+        has positions that oldKey does not.
+        """
+        if not newKey <= oldKey:
+            return None
+        return list(oldKey - newKey)
+
+    def removeTargets(self, field, members, removed, inPlace=False):
+        """
+        Return field and members without the targets in removed, changed in
+        place if inPlace and as copies otherwise.  Only the cells that were
+        nearest to a removed target are searched again, outwards from the
+        cells around them that kept their target.
+        """
+        if not inPlace:
+            field = dict(field)
+            members = dict(members)
+        affected = []
+        for target in removed:
+            affected.extend(members.pop(target, []))
+        for cell in affected:
+            del field[cell]
+        frontier = []
+        for cell in affected:
+            for direction, neighbor in self.neighbors[cell]:
+                if neighbor in field:
+                    distance, origin = field[neighbor]
+                    frontier.append((distance + 1, cell, origin))
+        heapq.heapify(frontier)
+        gained = {}
+        while frontier:
+            distance, cell, origin = heapq.heappop(frontier)
+            if cell in field:
+                continue
+            field[cell] = (distance, origin)
+            gained.setdefault(origin, []).append(cell)
+            for direction, neighbor in self.neighbors[cell]:
+                if neighbor not in field:
+                    heapq.heappush(frontier, (distance + 1, neighbor, origin))
+        for origin, cells in gained.items():
+            # Member lists may be shared with the field this one was copied from
+            members[origin] = members[origin] + cells
+        return field, members
+
+    def findParent(self, key, targets):
+        """
+        Return (parent entry, removed targets, whether to update it in place)
+        for a cached field that the field of targets can be derived from, or
+        None.  Must be called with the lock held.
+
+        A food Grid made by Grid.copyWithout names its parent's hash.  The
+        parent's field is handed on to the child and updated in place, unless
+        the parent has been asked for again after an earlier hand-on, in
+        which case it is copied.  A set of positions is compared with the
+        most recent set.
+        """
+        if isinstance(targets, Grid):
+            if targets.removedFrom == None:
+                return None
+            parentKey, removedCell = targets.removedFrom
+            if parentKey not in self.targetFields:
+                return None
+            entry = self.targetFields[parentKey]
+            if entry[2]:
+                return entry, [removedCell], False
+            del self.targetFields[parentKey]
+            self.handedOn[parentKey] = True
+            while len(self.handedOn) > self.maxTargetFields:
+                self.handedOn.popitem(last=False)
+            return entry, [removedCell], True
+        if len(self.targetFields) == 0:
+            return None
+        lastKey = next(reversed(self.targetFields))
+        if not isinstance(lastKey, frozenset):
+            return None
+        entry = self.targetFields[lastKey]
+        removed = self.removedTargets(lastKey, key)
+        if removed == None or 2 * len(removed) > len(entry[1]):
+            return None
+        return entry, removed, False
+
+    def lookupTargetField(self, targets):
+        """
+        Return the cached field of targets, computing it if needed.  The
+        field may later be updated in place for other targets, so it must
+        only be read with the lock held, and this must be called with the
+        lock held.
+        """
+        key = self.targetKey(targets)
+        if key in self.targetFields:
+            self.targetFields.move_to_end(key)
+            return self.targetFields[key][0]
+        parent = self.findParent(key, targets)
+        shared = self.handedOn.pop(key, False)
+        if parent != None:
+            (lastField, lastMembers, lastShared), removed, inPlace = parent
+            field, members = self.removeTargets(lastField, lastMembers, removed, inPlace)
+        elif isinstance(targets, Grid):
+            field, members = self.breadthFirstWithMembers(targets.asList())
+        else:
+            field, members = self.breadthFirstWithMembers(targets)
+        self.targetFields[key] = [field, members, shared]
+        while len(self.targetFields) > self.maxTargetFields:
+            self.targetFields.popitem(last=False)
+        return field
+
+    def getTargetField(self, targets):
+        """
+        Return a dict from every cell that can reach one of targets (a Grid of
+        booleans or a collection of positions) to a pair (distance, nearest
+        target).  The dict is a copy the caller owns; getNearestTarget and
+        getPathToNearestTarget read the cached field without copying it.
+        """
+        self.lock.acquire()
+        try:
+            return dict(self.lookupTargetField(targets))
+        finally:
+            self.lock.release()
+
+    def getNearestTarget(self, pos, targets):
+        """
+        Return (distance, target) for the target nearest to pos in the maze,
+        or None if no target can be reached.
+        """
+        self.lock.acquire()
+        try:
+            return self.lookupTargetField(targets).get(pos)
+        finally:
+            self.lock.release()
+
+    def getPathToNearestTarget(self, pos, targets):
+        """
+        Return a shortest list of actions from pos to the nearest of targets,
+        or None if no target can be reached.
+        """
+        self.lock.acquire()
+        try:
+            field = self.lookupTargetField(targets)
+            if pos not in field:
+                return None
+            return self.descend(pos, lambda cell: field[cell][0] if cell in field else None)
+        finally:
+            self.lock.release()
+
+    def descend(self, start, distanceTo):
+        """
+        Follow decreasing distances from start down to a cell at distance 0.
+        """
+        actions = []
+        cell = start
+        distance = distanceTo(cell)
+        while distance > 0:
+            for direction, neighbor in self.neighbors[cell]:
+                if distanceTo(neighbor) == distance - 1:
+                    actions.append(direction)
+                    cell = neighbor
+                    break
+            distance -= 1
+        return actions
+
+
 def getLayout(name, back=2):
-    if name.endswith('.lay'):
-        layout = tryToLoad('layouts/' + name)
-        if layout == None:
-            layout = tryToLoad(name)
-    else:
-        layout = tryToLoad('layouts/' + name + '.lay')
-        if layout == None:
-            layout = tryToLoad(name + '.lay')
-    if layout == None and back >= 0:
-        curdir = os.path.abspath('.')
-        os.chdir('..')
-        layout = getLayout(name, back - 1)
-        os.chdir(curdir)
-    return layout
+    """
+    Return the Layout called name, looking in layouts/ directories first and
+    then for the bare file name, from the working directory up to back + 1
+    parent directories.  Layouts are parsed once per process and shared; use
+    deepCopy() on the result before changing it.
+    """
+    return getLayoutRegistry(back).getLayout(name)
 
 
 def tryToLoad(fullname):
@@ -162,3 +509,139 @@ def tryToLoad(fullname):
         return Layout([line.strip() for line in f])
     finally:
         f.close()
+
+
+##############################
+# LAYOUT REGISTRY AND CACHES #
+##############################
+
+LAYOUT_CACHE = {}
+LAYOUT_REGISTRIES = {}
+layoutCacheLock = threading.Lock()
+
+
+class LayoutRegistry:
+    """
+    Indexes every layouts/ directory reachable from a root directory once, so
+    that names resolve to files without changing the working directory.  Parsed
+    layouts live in LAYOUT_CACHE keyed by (name, content hash) and are shared
+    by every registry in the process.
+    """
+
+    def __init__(self, root, back=2):
+        self.root = os.path.abspath(root)
+        self.back = back
+        self.searchDirs = [self.root]
+        for i in range(back + 1):
+            self.searchDirs.append(os.path.dirname(self.searchDirs[-1]))
+        self.index = None
+        self.fileHashes = {}
+
+    def buildIndex(self):
+        """
+        Map each layout name (with and without .lay) to the first file of that
+        name found, searching the nearest layouts/ directory first.
+        """
+        index = {}
+        for directory in self.searchDirs:
+            layoutDir = os.path.join(directory, 'layouts')
+            if not os.path.isdir(layoutDir):
+                continue
+            for fileName in sorted(os.listdir(layoutDir)):
+                if not fileName.endswith('.lay'):
+                    continue
+                path = os.path.join(layoutDir, fileName)
+                index.setdefault(fileName, path)
+                index.setdefault(fileName[:-len('.lay')], path)
+        self.index = index
+        return index
+
+    def findLayoutFile(self, name):
+        """
+        Return the path of the file for name, or None if there is none.  Names
+        missing from the index (files added later, or relative paths) are
+        looked up directly.
+        """
+        if self.index == None:
+            self.buildIndex()
+        if name in self.index:
+            return self.index[name]
+        fileName = name if name.endswith('.lay') else name + '.lay'
+        for directory in self.searchDirs:
+            for path in [os.path.join(directory, 'layouts', fileName),
+                         os.path.join(directory, fileName)]:
+                if os.path.isfile(path):
+                    return path
+        return None
+
+    def getLayout(self, name):
+        path = self.findLayoutFile(name)
+        if path == None:
+            return None
+        return self.loadLayoutFile(name, path)
+
+    def loadLayoutFile(self, name, path):
+        """
+        Parse the file at path unless a layout with the same name and contents
+        has already been parsed.  Files are only re-read when their
+        modification time changes.
+        """
+        mtime = os.path.getmtime(path)
+        cached = self.fileHashes.get(path)
+        if cached != None and cached[0] == mtime:
+            key = (name, cached[1])
+            if key in LAYOUT_CACHE:
+                return LAYOUT_CACHE[key]
+        f = open(path)
+        try:
+            text = f.read()
+        finally:
+            f.close()
+        contentHash = hashlib.sha1(text.encode()).hexdigest()
+        self.fileHashes[path] = (mtime, contentHash)
+        key = (name, contentHash)
+        layoutCacheLock.acquire()
+        try:
+            if key not in LAYOUT_CACHE:
+                LAYOUT_CACHE[key] = Layout([line.strip()
+                                            for line in text.splitlines()])
+            return LAYOUT_CACHE[key]
+        finally:
+            layoutCacheLock.release()
+
+    def prewarm(self, names=None):
+        """
+        Parse the named layouts (all indexed layouts by default) so that
+        processes forked afterwards start with a full cache.
+        """
+        if self.index == None:
+            self.buildIndex()
+        if names == None:
+            names = [name for name in self.index if not name.endswith('.lay')]
+        return [self.getLayout(name) for name in names]
+
+
+def getLayoutRegistry(back=2, root=None):
+    """
+    Return the registry for root (the working directory by default), creating
+    and indexing it on first use.
+    """
+    if root == None:
+        root = os.getcwd()
+    key = (os.path.abspath(root), back)
+    layoutCacheLock.acquire()
+    try:
+        if key not in LAYOUT_REGISTRIES:
+            LAYOUT_REGISTRIES[key] = LayoutRegistry(root, back)
+        return LAYOUT_REGISTRIES[key]
+    finally:
+        layoutCacheLock.release()
+
+
+def prewarmLayouts(names=None, back=2):
+    """
+    Fill LAYOUT_CACHE before starting worker processes, or pass this as the
+    initializer of a multiprocessing.Pool so each worker parses its layouts
+    exactly once.
+    """
+    getLayoutRegistry(back).prewarm(names)
@@ -0,0 +1,189 @@
+# layoutBenchmark.py
+# ------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Scaling benchmarks over generated layouts (see layoutGenerator.py).
+
+Each subsystem benchmark takes a layout, runs one representative workload on
+it and is timed with time.perf_counter and tracemalloc.  Subsystems whose
+modules are not part of the current project (search.py lives in search,
+multiAgents.py in multiagent, inference.py in tracking, ...) are skipped, so
+the same file can be run from any project directory:
+
+python layoutBenchmark.py --sizes 11,21,41,81 --seeds 3 -o scaling.csv
+
+Every row of the output holds the subsystem, the maze size, the number of
+open cells, the seed, the wall time in seconds and the peak memory allocated
+during the run in kilobytes.
+"""
+
+import sys
+import time
+import tracemalloc
+
+import layoutGenerator
+
+def farthestOpenCell(lay, start):
+    x0, y0 = start
+    cells = lay.walls.asList(False)
+    return max(cells, key=lambda cell: abs(cell[0] - x0) + abs(cell[1] - y0))
+
+def benchmarkSearch(lay):
+    """
+    Breadth-first search and A* (Manhattan heuristic) from Pacman to the
+    farthest open cell.
+    """
+    import pacman
+    import search
+    import searchAgents
+    state = pacman.GameState()
+    state.initialize(lay, lay.getNumGhosts())
+    goal = farthestOpenCell(lay, state.getPacmanPosition())
+    problem = searchAgents.PositionSearchProblem(state, goal=goal, warn=False, visualize=False)
+    search.breadthFirstSearch(problem)
+    problem = searchAgents.PositionSearchProblem(state, goal=goal, warn=False, visualize=False)
+    search.aStarSearch(problem, searchAgents.manhattanHeuristic)
+
+def benchmarkMultiAgents(lay):
+    """
+    One depth-2 alpha-beta decision with the better evaluation function.
+    """
+    import pacman
+    import multiAgents
+    state = pacman.GameState()
+    state.initialize(lay, lay.getNumGhosts())
+    agent = multiAgents.AlphaBetaAgent(evalFn='betterEvaluationFunction', depth='2')
+    agent.getAction(state)
+
+def benchmarkDistances(lay):
+    """
+    All-pairs maze distances from distanceCalculator.computeDistances.
+    """
+    import distanceCalculator
+    distanceCalculator.computeDistances(lay)
+
+def benchmarkInference(lay, steps=5):
+    """
+    A few observe/elapse steps of exact inference for the first ghost.
+    """
+    import busters
+    import ghostAgents
+    import inference
+    state = busters.GameState()
+    state.initialize(lay, lay.getNumGhosts())
+    module = inference.ExactInference(ghostAgents.RandomGhost(1))
+    module.initialize(state)
+    for step in range(steps):
+        module.observe(state)
+        module.elapseTime(state)
+
+SUBSYSTEMS = [
+    ('search', ['search', 'searchAgents'], benchmarkSearch),
+    ('multiAgents', ['multiAgents'], benchmarkMultiAgents),
+    ('distances', ['distanceCalculator'], benchmarkDistances),
+    ('inference', ['inference', 'busters'], benchmarkInference),
+]
+
+def availableSubsystems():
+    """
+    Return the names of the subsystems whose modules can be imported here.
+    """
+    import importlib.util
+    return [name for name, modules, fn in SUBSYSTEMS
+            if all([importlib.util.find_spec(m) != None for m in modules])]
+
+def measure(fn, lay):
+    """
+    Return (seconds, peak kilobytes) for one call of fn(lay).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        fn(lay)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak / 1024.0
+
+def runBenchmarks(subsystems, sizes, seeds=1, loopDensity=0.1, foodDensity=0.5,
+                  numCapsules=2, numGhosts=2, out=sys.stdout):
+    """
+    Run each subsystem on square mazes of every size in sizes, one maze per
+    seed, writing a CSV row per run to out.  Returns the rows as tuples.
+    """
+    import importlib
+    functions = dict([(name, fn) for name, modules, fn in SUBSYSTEMS])
+    for name, modules, fn in SUBSYSTEMS:
+        if name in subsystems:
+            # Import up front so the first run does not pay for it
+            for module in modules: importlib.import_module(module)
+    rows = []
+    out.write('subsystem,width,height,cells,seed,seconds,peakKB\n')
+    for size in sizes:
+        for seed in range(seeds):
+            lay = layoutGenerator.generateLayout(size, size, loopDensity, foodDensity,
+                                                 numCapsules, numGhosts, seed)
+            cells = len(lay.walls.asList(False))
+            for name in subsystems:
+                seconds, peak = measure(functions[name], lay)
+                row = (name, lay.width, lay.height, cells, seed, seconds, peak)
+                rows.append(row)
+                out.write('%s,%d,%d,%d,%d,%.6f,%.1f\n' % row)
+                out.flush()
+    return rows
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python layoutBenchmark.py <options>
+    EXAMPLE:    python layoutBenchmark.py --sizes 11,21,41 --subsystems search
+                  - times the search algorithms on three maze sizes
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('--sizes', dest='sizes', default='11,21,31,41',
+                      help='comma separated maze sizes [Default: %default]')
+    parser.add_option('--subsystems', dest='subsystems', default=None,
+                      help='comma separated subsystems to run; all available ones if omitted '
+                           '(%s)' % ', '.join([name for name, modules, fn in SUBSYSTEMS]))
+    parser.add_option('--seeds', type='int', dest='seeds', default=1,
+                      help='number of mazes (seeds 0..n-1) per size [Default: %default]')
+    parser.add_option('-l', '--loops', type='float', dest='loopDensity', default=0.1,
+                      help='fraction of inner walls removed [Default: %default]')
+    parser.add_option('-f', '--food', type='float', dest='foodDensity', default=0.5,
+                      help='fraction of free cells with food [Default: %default]')
+    parser.add_option('-c', '--capsules', type='int', dest='numCapsules', default=2,
+                      help='number of capsules [Default: %default]')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=2,
+                      help='number of ghosts [Default: %default]')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='CSV file to write; prints to stdout if omitted')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    if options.subsystems == None:
+        subsystems = availableSubsystems()
+    else:
+        subsystems = options.subsystems.split(',')
+    sizes = [int(size) for size in options.sizes.split(',')]
+    out = sys.stdout if options.output == None else open(options.output, 'w')
+    try:
+        runBenchmarks(subsystems, sizes, options.seeds, options.loopDensity,
+                      options.foodDensity, options.numCapsules, options.numGhosts, out)
+    finally:
+        if out != sys.stdout: out.close()
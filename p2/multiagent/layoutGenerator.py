@@ -0,0 +1,147 @@
+# layoutGenerator.py
+# ------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Procedurally generated Pacman mazes, for layouts far larger than the
+hand-written ones in layouts/.
+
+A maze is carved by a randomized depth-first search over the cells with odd
+coordinates, which yields a perfect maze (exactly one path between any two
+cells).  A fraction loopDensity of the remaining inner walls is then knocked
+down to create cycles, and Pacman, ghosts, capsules and food are scattered
+over the open cells.  Everything is drawn from a random.Random seeded with
+seed, so the same arguments always produce the same maze.
+
+Example:
+lay = generateLayout(41, 21, loopDensity=0.2, seed=3)
+writeLayout(generateLayoutText(41, 21, seed=3), 'layouts/gen41x21.lay')
+
+From the command line:
+python layoutGenerator.py -W 41 -H 21 --seed 3 -o layouts/gen41x21.lay
+"""
+
+import random
+import sys
+
+import layout
+
+def generateLayoutText(width, height, loopDensity=0.1, foodDensity=0.5,
+                       numCapsules=2, numGhosts=2, seed=None):
+    """
+    Return the rows of a new maze as a list of strings, top row first, in the
+    format read by layout.Layout.
+
+    width and height include the outer wall and must be at least 5; even
+    sizes leave a double wall on the right or top.  foodDensity is the
+    fraction of free cells (those without an agent or capsule) given food.
+    """
+    if width < 5 or height < 5:
+        raise ValueError('Mazes must be at least 5x5, got %dx%d' % (width, height))
+    rand = random.Random(seed)
+    walls = [[True for y in range(height)] for x in range(width)]
+    maxX = width - 2 if width % 2 == 1 else width - 3
+    maxY = height - 2 if height % 2 == 1 else height - 3
+
+    # Carve a perfect maze with an iterative randomized depth-first search
+    walls[1][1] = False
+    stack = [(1, 1)]
+    while stack:
+        x, y = stack[-1]
+        neighbors = [(x + dx, y + dy, dx, dy) for dx, dy in [(0, 2), (0, -2), (2, 0), (-2, 0)]
+                     if 1 <= x + dx <= maxX and 1 <= y + dy <= maxY and walls[x + dx][y + dy]]
+        if not neighbors:
+            stack.pop()
+            continue
+        nextX, nextY, dx, dy = rand.choice(neighbors)
+        walls[x + dx // 2][y + dy // 2] = False
+        walls[nextX][nextY] = False
+        stack.append((nextX, nextY))
+
+    # Knock down inner walls that separate two open cells to create loops
+    innerWalls = [(x, y) for x in range(1, maxX + 1) for y in range(1, maxY + 1)
+                  if walls[x][y] and (x + y) % 2 == 1]
+    rand.shuffle(innerWalls)
+    for x, y in innerWalls[:int(round(loopDensity * len(innerWalls)))]:
+        walls[x][y] = False
+
+    openCells = [(x, y) for x in range(width) for y in range(height) if not walls[x][y]]
+    numAgents = 1 + numGhosts
+    if numAgents + numCapsules > len(openCells):
+        raise ValueError('Not enough open cells for %d agents and %d capsules'
+                         % (numAgents, numCapsules))
+    rand.shuffle(openCells)
+    chars = [['%' if walls[x][y] else ' ' for x in range(width)] for y in range(height)]
+    placed = ['P'] + ['G'] * numGhosts + ['o'] * numCapsules
+    for (x, y), char in zip(openCells, placed):
+        chars[y][x] = char
+    free = openCells[len(placed):]
+    for x, y in free[:int(round(foodDensity * len(free)))]:
+        chars[y][x] = '.'
+    chars.reverse()
+    return [''.join(row) for row in chars]
+
+def generateLayout(width, height, loopDensity=0.1, foodDensity=0.5,
+                   numCapsules=2, numGhosts=2, seed=None):
+    """
+    Return a layout.Layout for a new maze; see generateLayoutText.
+    """
+    return layout.Layout(generateLayoutText(width, height, loopDensity, foodDensity,
+                                            numCapsules, numGhosts, seed))
+
+def writeLayout(layoutText, fileName):
+    """
+    Save the rows returned by generateLayoutText as a .lay file.
+    """
+    f = open(fileName, 'w')
+    try: f.write('\n'.join(layoutText) + '\n')
+    finally: f.close()
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python layoutGenerator.py <options>
+    EXAMPLE:    python layoutGenerator.py -W 61 -H 31 --loops 0.2 --seed 1 -o layouts/big.lay
+                  - writes a 61x31 maze with some loops to layouts/big.lay
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-W', '--width', type='int', dest='width', default=21,
+                      help='maze width including the outer wall [Default: %default]')
+    parser.add_option('-H', '--height', type='int', dest='height', default=11,
+                      help='maze height including the outer wall [Default: %default]')
+    parser.add_option('-l', '--loops', type='float', dest='loopDensity', default=0.1,
+                      help='fraction of inner walls removed [Default: %default]')
+    parser.add_option('-f', '--food', type='float', dest='foodDensity', default=0.5,
+                      help='fraction of free cells with food [Default: %default]')
+    parser.add_option('-c', '--capsules', type='int', dest='numCapsules', default=2,
+                      help='number of capsules [Default: %default]')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=2,
+                      help='number of ghosts [Default: %default]')
+    parser.add_option('-s', '--seed', type='int', dest='seed', default=None,
+                      help='random seed [Default: %default]')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='.lay file to write; prints the maze if omitted')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    text = generateLayoutText(options.width, options.height, options.loopDensity,
+                              options.foodDensity, options.numCapsules,
+                              options.numGhosts, options.seed)
+    if options.output == None:
+        print('\n'.join(text))
+    else:
+        writeLayout(text, options.output)
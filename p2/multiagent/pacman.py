@@ -379,8 +379,7 @@ class PacmanRules:
         # Eat food
         if state.data.food[x][y]:
             state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.food = state.data.food.copyWithout(x, y)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
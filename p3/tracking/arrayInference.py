@@ -0,0 +1,863 @@
+# arrayInference.py
+# -----------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+NumPy backends for the inference modules in inference.py.
+
+Beliefs are stored as vectors over a fixed CellIndex of the positions a ghost
+can occupy, so observation and time updates are array operations instead of
+Python loops over positions.  The modules here are drop-in replacements for
+the ones in inference.py and can be selected by name, for example:
+
+python busters.py -p GreedyBustersAgent -a inference=arrayInference.ArrayExactInference
+python busters.py -p GreedyBustersAgent -a inference=arrayInference.ArrayParticleFilter
+python busters.py -p GreedyBustersAgent -a inference=arrayInference.ArrayMarginalInference
+python busters.py -p GreedyBustersAgent -a inference=arrayInference.AdaptiveParticleFilter
+python busters.py -p GreedyBustersAgent -a inference=arrayInference.AdaptiveMarginalInference
+
+getBeliefDistribution still returns an inference.DiscreteDistribution, so
+the display and the agents in bustersAgents.py work unchanged.
+"""
+
+import numpy as np
+
+import busters
+import game
+import inference
+
+
+class CellIndex:
+    """
+    Assigns every position in a fixed list an integer cell id, and keeps the
+    coordinates as arrays so that distances to all cells are one operation.
+    """
+    def __init__(self, positions):
+        self.positions = list(positions)
+        self.ids = dict([(pos, i) for i, pos in enumerate(self.positions)])
+        self.xs = np.array([pos[0] for pos in self.positions])
+        self.ys = np.array([pos[1] for pos in self.positions])
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, pos):
+        return pos in self.ids
+
+    def getId(self, pos):
+        return self.ids[pos]
+
+    def manhattanDistancesFrom(self, pos):
+        """
+        Return an int array of the Manhattan distance from pos to every cell.
+        """
+        x, y = pos
+        return (np.abs(self.xs - x) + np.abs(self.ys - y)).astype(int)
+
+    def toDistribution(self, weights):
+        """
+        Return an inference.DiscreteDistribution with an entry for every cell.
+        """
+        return inference.DiscreteDistribution(zip(self.positions, weights.tolist()))
+
+
+def buildObservationTable(maxTrueDistance, log=False):
+    """
+    Return busters' observation table (or its log, with log=True) as a 2-D
+    array whose [noisyDistance, trueDistance] entry is P(noisyDistance |
+    trueDistance), for every noisy reading the sensor can produce at true
+    distances up to maxTrueDistance.
+    """
+    maxNoisyDistance = int(maxTrueDistance + busters.SONAR_MAX)
+    if log:
+        table = busters.getLogObservationTable(maxTrueDistance)
+    else:
+        table = busters.getObservationTable(maxTrueDistance)
+    return np.array(table)[:maxNoisyDistance + 1, :maxTrueDistance + 1]
+
+
+class TransitionMatrix:
+    """
+    A sparse matrix of P(newCell | oldCell) stored as parallel arrays of old
+    cell ids, new cell ids and probabilities.
+    """
+    def __init__(self, numCells, rows, cols, probs):
+        self.numCells = numCells
+        self.rows = np.asarray(rows, dtype=int)
+        self.cols = np.asarray(cols, dtype=int)
+        self.probs = np.asarray(probs, dtype=float)
+
+        self.successors = None
+        self.cdfs = None
+
+    def apply(self, beliefs):
+        """
+        Return the distribution over new cells given beliefs over old ones.
+        """
+        return np.bincount(self.cols, weights=beliefs[self.rows] * self.probs,
+                           minlength=self.numCells)
+
+    def getSamplingTables(self):
+        """
+        Return two (numCells, maxSuccessors) arrays: the successor cell ids of
+        each cell and their cumulative probabilities.  Each row's cumulative
+        probabilities reach exactly 1 at its last successor and stay there.
+        """
+        if self.successors is None:
+            counts = np.bincount(self.rows, minlength=self.numCells)
+            width = max(1, counts.max())
+            order = np.argsort(self.rows, kind='stable')
+            rows, cols, probs = self.rows[order], self.cols[order], self.probs[order]
+            starts = np.cumsum(counts) - counts
+            slots = np.arange(len(rows)) - starts[rows]
+            successors = np.repeat(np.arange(self.numCells)[:, None], width, axis=1)
+            weights = np.zeros((self.numCells, width))
+            successors[rows, slots] = cols
+            weights[rows, slots] = probs
+            cdfs = np.cumsum(weights, axis=1)
+            totals = cdfs[:, -1:].copy()
+            totals[totals == 0] = 1.0
+            cdfs /= totals
+            last = np.maximum(counts - 1, 0)
+            cdfs[np.arange(width)[None, :] >= last[:, None]] = 1.0
+            self.successors, self.cdfs = successors, cdfs
+        return self.successors, self.cdfs
+
+    def sample(self, cellIds, rng):
+        """
+        Draw a successor for every entry of cellIds.
+        """
+        successors, cdfs = self.getSamplingTables()
+        draws = rng.random(len(cellIds))
+        slots = (draws[:, None] >= cdfs[cellIds]).sum(axis=1)
+        return successors[cellIds, slots]
+
+    def sampleCounts(self, counts, rng):
+        """
+        Move a histogram of particle counts over cells: the counts of every
+        occupied cell are split over its successors with one multinomial draw.
+        """
+        successors, cdfs = self.getSamplingTables()
+        occupied = np.flatnonzero(counts)
+        pvals = np.diff(cdfs[occupied], axis=1, prepend=0.0)
+        draws = rng.multinomial(counts[occupied], pvals)
+        newCounts = np.bincount(successors[occupied].ravel(), weights=draws.ravel(),
+                                minlength=self.numCells)
+        return newCounts.astype(int)
+
+
+def kldParticleCount(numBins, error, quantile):
+    """
+    Return the number of samples KLD-sampling asks for once they fall into
+    numBins distinct bins: with probability 1 - delta, where quantile is the
+    upper 1 - delta quantile of the standard normal, the KL divergence between
+    the sample-based and the true distribution stays below error.
+    """
+    if numBins <= 1:
+        return 1
+    k = numBins - 1
+    a = 2.0 / (9.0 * k)
+    return int(np.ceil(k / (2.0 * error) * (1.0 - a + np.sqrt(a) * quantile) ** 3))
+
+
+def drawAdaptiveCounts(probs, minParticles, maxParticles, error, quantile, rng):
+    """
+    Draw a histogram of particle counts over the bins of probs by
+    KLD-sampling: samples are added until their number covers
+    kldParticleCount of the bins they occupy, clamped to [minParticles,
+    maxParticles].  Concentrated distributions therefore get few particles.
+    """
+    counts = np.zeros(len(probs), dtype=int)
+    drawn, needed = 0, minParticles
+    while drawn < needed:
+        counts += rng.multinomial(needed - drawn, probs)
+        drawn = needed
+        numBins = np.count_nonzero(counts)
+        needed = min(maxParticles, max(minParticles, kldParticleCount(numBins, error, quantile)))
+    return counts
+
+
+def systematicResample(weights, rng):
+    """
+    Return how many copies of each entry to keep when drawing sum(counts) ==
+    len(weights) samples by systematic resampling: one uniform offset u and
+    evenly spaced pointers (u + j) / N into the cumulative weights.  This is
+    O(N) and has lower variance than independent draws.
+    """
+    n = len(weights)
+    cumulative = np.cumsum(weights)
+    cumulative /= cumulative[-1]
+    cumulative[-1] = 1.0
+    offset = rng.random()
+    marks = np.ceil(cumulative * n - offset).astype(int)
+    return np.diff(np.concatenate([[0], marks]))
+
+
+class ArrayInferenceModule:
+    """
+    Shared machinery for the array inference modules: the CellIndex over
+    self.allPositions, the observation likelihood vector and the transition
+    matrices, which are built once per Pacman position.  Ghost policies are
+    therefore assumed to depend on the state only through Pacman's position;
+    a ghost agent whose policy does not depend on it at all can set
+    ignoresPacman = True, and its matrices are then patched from one shared
+    move kernel.
+
+    Subclasses must also inherit from inference.InferenceModule.
+    """
+    maxCachedTransitions = 64
+
+    def initialize(self, gameState):
+        """
+        Like InferenceModule.initialize, but rebuilds the CellIndex, tables and
+        NumPy generator before the first initializeUniformly, so a module reused
+        on another layout or seed starts afresh.
+        """
+        self.legalPositions = [p for p in gameState.getWalls().asList(False) if p[1] > 1]
+        self.allPositions = self.legalPositions + [self.getJailPosition()]
+        self.invalidateKernels()
+        self.initializeCells(gameState)
+        self.initializeUniformly(gameState)
+
+    def initializeCells(self, gameState):
+        self.cells = CellIndex(self.allPositions)
+        self.jailId = self.cells.getId(self.getJailPosition())
+        walls = gameState.getWalls()
+        self.observationTable = buildObservationTable(walls.width + walls.height)
+        self.logObservationTable = buildObservationTable(walls.width + walls.height, log=True)
+        self.transitions = {}
+        self.moveKernel = None
+        # Seeded from randomStream so seeding it still fixes a run
+        self.rng = np.random.default_rng(self.randomStream.getrandbits(64))
+
+    def getObservationVector(self, observation, pacmanPosition, log=False):
+        """
+        Return getObservationProb for every cell as an array, or its log with
+        log=True.
+        """
+        table = self.logObservationTable if log else self.observationTable
+        impossible, certain = (-np.inf, 0.0) if log else (0.0, 1.0)
+        likelihood = np.full(len(self.cells), impossible)
+        if observation == None:
+            likelihood[self.jailId] = certain
+            return likelihood
+        # Noisy distances are whole numbers, but may arrive as floats
+        noisyDistance = int(observation)
+        if noisyDistance < table.shape[0]:
+            distances = self.cells.manhattanDistancesFrom(pacmanPosition)
+            likelihood = table[noisyDistance, distances]
+        likelihood[self.jailId] = impossible
+        return likelihood
+
+    def getTransitionMatrix(self, gameState):
+        """
+        Return the TransitionMatrix for the current Pacman position, building
+        it the first time that position is seen.
+
+        For a ghost agent with ignoresPacman set, only capture depends on
+        Pacman, and a ghost can only be caught within two steps of him.  The
+        matrix is then the ghost's own move kernel, built once, with the rows
+        of those few cells replaced by getPositionDistribution.  Otherwise
+        every row comes from getPositionDistribution.
+        """
+        pacmanPosition = gameState.getPacmanPosition()
+        if pacmanPosition not in self.transitions:
+            if len(self.transitions) >= self.maxCachedTransitions:
+                self.transitions.clear()
+            if getattr(self.ghostAgent, 'ignoresPacman', False):
+                rows, cols, probs = self.getMoveKernel(gameState)
+                nearby = self.cells.manhattanDistancesFrom(pacmanPosition) <= 2
+                keep = ~nearby[rows]
+                rows, cols, probs = [rows[keep]], [cols[keep]], [probs[keep]]
+                oldIds = np.flatnonzero(nearby)
+            else:
+                rows, cols, probs = [], [], []
+                oldIds = range(len(self.cells))
+            newRows, newCols, newProbs = [], [], []
+            for oldId in oldIds:
+                newPosDist = self.getPositionDistribution(gameState, self.cells.positions[oldId])
+                for newPos, prob in newPosDist.items():
+                    if newPos in self.cells and prob > 0:
+                        newRows.append(oldId)
+                        newCols.append(self.cells.getId(newPos))
+                        newProbs.append(prob)
+            rows.append(np.asarray(newRows, dtype=int))
+            cols.append(np.asarray(newCols, dtype=int))
+            probs.append(np.asarray(newProbs, dtype=float))
+            self.transitions[pacmanPosition] = TransitionMatrix(
+                len(self.cells), np.concatenate(rows), np.concatenate(cols),
+                np.concatenate(probs))
+        return self.transitions[pacmanPosition]
+
+    def getMoveKernel(self, gameState):
+        """
+        Return (rows, cols, probs) arrays of the ghost's own move distribution
+        from every cell, without capture.  The ghost is placed the way
+        setGhostPosition places it for getPositionDistribution.
+        """
+        if self.moveKernel is None:
+            rows, cols, probs = [], [], []
+            for oldId, oldPos in enumerate(self.cells.positions):
+                state = self.setGhostPosition(gameState, oldPos, self.index)
+                for action, prob in self.ghostAgent.getDistribution(state).items():
+                    newPos = game.Actions.getSuccessor(oldPos, action)
+                    if newPos in self.cells and prob > 0:
+                        rows.append(oldId)
+                        cols.append(self.cells.getId(newPos))
+                        probs.append(prob)
+            self.moveKernel = (np.asarray(rows, dtype=int), np.asarray(cols, dtype=int),
+                               np.asarray(probs, dtype=float))
+        return self.moveKernel
+
+    def invalidateKernels(self):
+        inference.InferenceModule.invalidateKernels(self)
+        self.transitions = {}
+        self.moveKernel = None
+
+
+class ArrayExactInference(ArrayInferenceModule, inference.ExactInference):
+    """
+    ExactInference with beliefs kept in a NumPy vector over self.allPositions.
+
+    The observation update multiplies the beliefs by one row of a precomputed
+    P(noisyDistance | trueDistance) table indexed by the vector of distances
+    from Pacman.  The time update is a sparse matrix-vector product.
+    """
+    def initializeUniformly(self, gameState):
+        self.beliefVector = np.zeros(len(self.cells))
+        for pos in self.legalPositions:
+            self.beliefVector[self.cells.getId(pos)] = 1.0
+        self.beliefVector /= self.beliefVector.sum()
+
+    def observeUpdate(self, observation, gameState):
+        """
+        Update beliefs based on the distance observation and Pacman's position.
+        """
+        self.beliefVector = self.beliefVector * \
+            self.getObservationVector(observation, gameState.getPacmanPosition())
+        self.normalizeBeliefs()
+
+    def elapseTime(self, gameState):
+        """
+        Predict beliefs in response to a time step passing from the current
+        state.
+        """
+        self.beliefVector = self.getTransitionMatrix(gameState).apply(self.beliefVector)
+        self.normalizeBeliefs()
+
+    def normalizeBeliefs(self):
+        total = self.beliefVector.sum()
+        if total > 0:
+            self.beliefVector /= total
+
+    def getBeliefDistribution(self):
+        return self.cells.toDistribution(self.beliefVector)
+
+
+class ArrayParticleFilter(ArrayInferenceModule, inference.ParticleFilter):
+    """
+    ParticleFilter with particles stored as an int array of cell ids and a
+    parallel array of log-weights.
+
+    Observations add log-likelihoods to the weights; the particles are then
+    resampled by systematic resampling in O(N) once the effective sample size
+    drops below resampleThreshold * numParticles (the default of 1.0
+    resamples after every observation, like ParticleFilter).  Time updates
+    draw every particle's successor at once from per-cell cumulative tables.
+    """
+    def __init__(self, ghostAgent, numParticles=300, resampleThreshold=1.0):
+        inference.ParticleFilter.__init__(self, ghostAgent, numParticles)
+        self.resampleThreshold = resampleThreshold
+
+    def initializeUniformly(self, gameState):
+        """
+        Spread the particles evenly over the legal positions, which occupy the
+        first len(self.legalPositions) cell ids.
+        """
+        self.particles = np.arange(self.numParticles) % len(self.legalPositions)
+        self.logWeights = np.zeros(self.numParticles)
+
+    def observeUpdate(self, observation, gameState):
+        """
+        Reweight the particles by the observation likelihood and resample.
+        When every particle has zero weight the particles are reinitialized.
+        """
+        logLikelihood = self.getObservationVector(observation, gameState.getPacmanPosition(), log=True)
+        particleLogLikelihood = logLikelihood[self.particles]
+        if np.isneginf(particleLogLikelihood).all():
+            self.initializeUniformly(gameState)
+            return
+        self.logWeights = self.logWeights + particleLogLikelihood
+        weights = self.getWeights()
+        effectiveSize = 1.0 / np.sum(weights ** 2)
+        if effectiveSize < self.resampleThreshold * self.numParticles + 1e-9:
+            counts = systematicResample(weights, self.rng)
+            self.particles = np.repeat(self.particles, counts)
+            self.logWeights = np.zeros(len(self.particles))
+
+    def getWeights(self):
+        """
+        Return the normalized particle weights.
+        """
+        weights = np.exp(self.logWeights - self.logWeights.max())
+        return weights / weights.sum()
+
+    def elapseTime(self, gameState):
+        """
+        Sample each particle's next cell from the transition model.
+        """
+        self.particles = self.getTransitionMatrix(gameState).sample(self.particles, self.rng)
+
+    def getBeliefDistribution(self):
+        beliefs = np.bincount(self.particles, weights=self.getWeights(),
+                              minlength=len(self.cells))
+        return self.cells.toDistribution(beliefs)
+
+
+class AdaptiveParticleFilter(ArrayInferenceModule, inference.ParticleFilter):
+    """
+    ParticleFilter whose particles are a histogram of counts over cells and
+    whose particle count is chosen by KLD-sampling after every observation.
+
+    The count shrinks towards minParticles as the belief collapses onto a few
+    cells and grows towards maxParticles after a reinitialization.  Every
+    update costs O(numCells) whatever the number of particles.  kldError and
+    kldQuantile set the KLD bound; the default quantile 2.326 corresponds to
+    99% confidence.
+    """
+    def __init__(self, ghostAgent, minParticles=100, maxParticles=5000,
+                 kldError=0.02, kldQuantile=2.326):
+        inference.ParticleFilter.__init__(self, ghostAgent, maxParticles)
+        self.minParticles = minParticles
+        self.maxParticles = maxParticles
+        self.kldError = kldError
+        self.kldQuantile = kldQuantile
+
+    def setNumParticles(self, numParticles):
+        self.numParticles = self.maxParticles = numParticles
+
+    def drawCounts(self, probs):
+        return drawAdaptiveCounts(probs, self.minParticles, self.maxParticles,
+                                  self.kldError, self.kldQuantile, self.rng)
+
+    def initializeUniformly(self, gameState):
+        probs = np.zeros(len(self.cells))
+        probs[:len(self.legalPositions)] = 1.0 / len(self.legalPositions)
+        self.counts = self.drawCounts(probs)
+
+    def observeUpdate(self, observation, gameState):
+        """
+        Resample a new histogram from the reweighted one, reinitializing when
+        every particle has zero weight.
+        """
+        likelihood = self.getObservationVector(observation, gameState.getPacmanPosition())
+        weights = self.counts * likelihood
+        total = weights.sum()
+        if total == 0:
+            self.initializeUniformly(gameState)
+            return
+        self.counts = self.drawCounts(weights / total)
+
+    def elapseTime(self, gameState):
+        self.counts = self.getTransitionMatrix(gameState).sampleCounts(self.counts, self.rng)
+
+    def getParticleCount(self):
+        return int(self.counts.sum())
+
+    def getBeliefDistribution(self):
+        return self.cells.toDistribution(self.counts / float(self.counts.sum()))
+
+
+class ArrayJointParticleFilter(inference.JointParticleFilter):
+    """
+    JointParticleFilter with particles stored as a (numParticles, numGhosts)
+    int array of cell ids.
+
+    The filter is factored when each ghost's transition model depends only
+    on its own position and Pacman's, as for every ghost that leaves
+    isStationary True (those in ghostAgents.py, for instance): every ghost's
+    column is then moved with one batch draw per step.  Otherwise, as for
+    DispersingGhost, which moves away from the other ghosts, the particles
+    are moved per distinct tuple with the full joint model.  The initial
+    particles are distinct tuples drawn at random from the
+    product of legal positions without ever listing that product, so the
+    filter scales to layouts like crowdedHunt with six ghosts.
+    """
+    maxCachedTransitions = 64
+
+    def __init__(self, numParticles=600, factoredThreshold=0.1):
+        inference.JointParticleFilter.__init__(self, numParticles)
+        self.factoredThreshold = factoredThreshold
+
+    def initialize(self, gameState, legalPositions):
+        self.numGhosts = gameState.getNumAgents() - 1
+        self.ghostAgents = []
+        self.legalPositions = legalPositions
+        jails = [self.getJailPosition(i) for i in range(self.numGhosts)]
+        self.cells = CellIndex(list(legalPositions) + jails)
+        self.jailIds = [self.cells.getId(jail) for jail in jails]
+        walls = gameState.getWalls()
+        self.observationTable = buildObservationTable(walls.width + walls.height)
+        self.rng = np.random.default_rng(self.randomStream.getrandbits(64))
+        self.invalidateKernels()
+        self.initializeUniformly(gameState)
+
+    def initializeUniformly(self, gameState):
+        """
+        Draw numParticles distinct tuples of legal positions uniformly at
+        random, or tile the whole product evenly when it has no more than
+        numParticles tuples.  Legal positions occupy the first
+        len(self.legalPositions) cell ids.
+        """
+        numLegal = len(self.legalPositions)
+        numTuples = numLegal ** self.numGhosts
+        if numTuples <= self.numParticles:
+            flat = np.arange(self.numParticles) % numTuples
+        elif numTuples < 2 ** 62:
+            flat = self.rng.choice(numTuples, size=self.numParticles, replace=False)
+        else:
+            flat = None
+        if flat is None:
+            # Too many tuples to index; repeats are vanishingly unlikely
+            self.particles = self.rng.integers(numLegal, size=(self.numParticles, self.numGhosts))
+        else:
+            digits = []
+            for i in range(self.numGhosts):
+                digits.append(flat % numLegal)
+                flat = flat // numLegal
+            self.particles = np.stack(digits[::-1], axis=1)
+
+    def getObservationVector(self, observation, pacmanPosition, ghostIndex):
+        """
+        Return getObservationProb for ghost ghostIndex (counting from 0) at
+        every cell, using that ghost's jail.
+        """
+        likelihood = np.zeros(len(self.cells))
+        jailId = self.jailIds[ghostIndex]
+        if observation == None:
+            likelihood[jailId] = 1.0
+            return likelihood
+        noisyDistance = int(observation)
+        if noisyDistance < self.observationTable.shape[0]:
+            distances = self.cells.manhattanDistancesFrom(pacmanPosition)
+            likelihood = self.observationTable[noisyDistance, distances]
+        likelihood[self.jailIds] = 0.0
+        return likelihood
+
+    def observeUpdate(self, observation, gameState):
+        """
+        Weight every particle by the product of its ghosts' likelihoods and
+        resample.
+
+        The likelihoods of all ghosts of all particles come from one gather
+        into a (numGhosts, numCells) table.  When the effective sample size of
+        the joint weights falls below factoredThreshold * numParticles (with
+        many ghosts almost no tuple agrees with every reading), each ghost's
+        column is resampled by its own likelihood instead, which is the exact
+        update under the factored transition model.  A ghost whose column has
+        zero weight everywhere is redrawn from its likelihood alone.
+        """
+        pacmanPosition = gameState.getPacmanPosition()
+        table = np.stack([self.getObservationVector(observation[i], pacmanPosition, i)
+                          for i in range(self.numGhosts)])
+        particleLikelihoods = table[np.arange(self.numGhosts), self.particles]
+        weights = particleLikelihoods.prod(axis=1)
+        total = weights.sum()
+        if total > 0:
+            weights = weights / total
+            effectiveSize = 1.0 / np.sum(weights ** 2)
+            if effectiveSize >= self.factoredThreshold * self.numParticles:
+                counts = systematicResample(weights, self.rng)
+                self.particles = np.repeat(self.particles, counts, axis=0)
+                return
+        particles = np.empty((self.numParticles, self.numGhosts), dtype=np.intp)
+        for i in range(self.numGhosts):
+            columnWeights = particleLikelihoods[:, i]
+            if columnWeights.sum() > 0:
+                counts = systematicResample(columnWeights, self.rng)
+                particles[:, i] = self.rng.permutation(np.repeat(self.particles[:, i], counts))
+            else:
+                particles[:, i] = self.drawFromLikelihood(table[i])
+        self.particles = particles
+
+    def drawFromLikelihood(self, likelihood):
+        """
+        Return numParticles cell ids drawn in proportion to likelihood, or
+        uniformly over the legal positions if it is zero everywhere.
+        """
+        total = likelihood.sum()
+        if total == 0:
+            return self.rng.integers(len(self.legalPositions), size=self.numParticles)
+        return self.rng.choice(len(self.cells), size=self.numParticles, p=likelihood / total)
+
+    def getTransitionMatrix(self, gameState, ghostIndex):
+        """
+        Return the TransitionMatrix of ghost ghostIndex for the current Pacman
+        position.  The other ghosts are placed in their jails while it is
+        built, so it only applies when the filter is factored.
+        """
+        pacmanPosition = gameState.getPacmanPosition()
+        key = (pacmanPosition, ghostIndex)
+        if key not in self.transitions:
+            if len(self.transitions) >= self.maxCachedTransitions * self.numGhosts:
+                self.transitions.clear()
+            ghostPositions = [self.getJailPosition(i) for i in range(self.numGhosts)]
+            agent = self.ghostAgents[ghostIndex]
+            rows, cols, probs = [], [], []
+            for oldId, oldPos in enumerate(self.cells.positions):
+                ghostPositions[ghostIndex] = oldPos
+                newPosDist = self.getPositionDistribution(gameState, ghostPositions,
+                                                          ghostIndex, agent)
+                for newPos, prob in newPosDist.items():
+                    if newPos in self.cells and prob > 0:
+                        rows.append(oldId)
+                        cols.append(self.cells.getId(newPos))
+                        probs.append(prob)
+            self.transitions[key] = TransitionMatrix(len(self.cells), rows, cols, probs)
+        return self.transitions[key]
+
+    def invalidateKernels(self):
+        inference.JointParticleFilter.invalidateKernels(self)
+        self.transitions = {}
+
+    def isFactored(self):
+        """
+        Whether every ghost's moves depend only on its own position and
+        Pacman's, so that the ghosts' columns can be moved independently.
+        """
+        return all([getattr(agent, 'isStationary', True) for agent in self.ghostAgents])
+
+    def moveJointly(self, gameState, tuples, counts):
+        """
+        Return an (N, numGhosts) array holding counts[t] successors of every
+        distinct tuple tuples[t], each ghost moved by its policy given the
+        positions of all the ghosts in the tuple.
+        """
+        positions = self.cells.positions
+        moved = []
+        for row, count in zip(tuples.tolist(), counts.tolist()):
+            ghostPositions = [positions[cellId] for cellId in row]
+            successors = np.empty((count, self.numGhosts), dtype=np.intp)
+            for i in range(self.numGhosts):
+                newPosDist = self.getPositionDistribution(gameState, ghostPositions, i,
+                                                          self.ghostAgents[i])
+                items = [(self.cells.getId(newPos), prob) for newPos, prob in newPosDist.items()
+                         if newPos in self.cells and prob > 0]
+                if len(items) == 0:
+                    successors[:, i] = row[i]
+                    continue
+                ids, probs = np.array(items).T
+                successors[:, i] = ids.astype(np.intp)[
+                    self.rng.choice(len(ids), size=count, p=probs / probs.sum())]
+            moved.append(successors)
+        return np.concatenate(moved)
+
+    def elapseTime(self, gameState):
+        """
+        Move every ghost of every particle with one batch draw per ghost, or
+        every distinct tuple with the joint model if the filter is not
+        factored.
+        """
+        if not self.isFactored():
+            tuples, counts = np.unique(self.particles, axis=0, return_counts=True)
+            self.particles = self.moveJointly(gameState, tuples, counts)
+            return
+        particles = self.particles.copy()
+        for i in range(self.numGhosts):
+            matrix = self.getTransitionMatrix(gameState, i)
+            particles[:, i] = matrix.sample(self.particles[:, i], self.rng)
+        self.particles = particles
+
+    def getBeliefDistribution(self):
+        """
+        Return the joint distribution over tuples of ghost positions.
+        """
+        rows, counts = np.unique(self.particles, axis=0, return_counts=True)
+        positions = self.cells.positions
+        dist = inference.DiscreteDistribution()
+        for row, count in zip(rows.tolist(), counts.tolist()):
+            dist[tuple([positions[cellId] for cellId in row])] = count
+        dist.normalize()
+        return dist
+
+    def getMarginalDistribution(self, ghostIndex):
+        """
+        Return the distribution over positions of ghost ghostIndex (counting
+        from 0), without building the joint distribution.
+        """
+        beliefs = np.bincount(self.particles[:, ghostIndex], minlength=len(self.cells))
+        return self.cells.toDistribution(beliefs / float(len(self.particles)))
+
+
+class AdaptiveJointParticleFilter(ArrayJointParticleFilter):
+    """
+    ArrayJointParticleFilter that stores its particles as the distinct tuples
+    (self.particles) with a count each (self.counts), and chooses the
+    particle count by KLD-sampling over tuples after every observation, like
+    AdaptiveParticleFilter.  Observation and time updates both cost
+    O(distinct tuples), never O(particles).
+    """
+    def __init__(self, minParticles=100, maxParticles=2000, kldError=0.02,
+                 kldQuantile=2.326, factoredThreshold=0.1):
+        ArrayJointParticleFilter.__init__(self, maxParticles, factoredThreshold)
+        self.minParticles = minParticles
+        self.maxParticles = maxParticles
+        self.kldError = kldError
+        self.kldQuantile = kldQuantile
+
+    def setNumParticles(self, numParticles):
+        self.numParticles = self.maxParticles = numParticles
+
+    def drawCounts(self, probs):
+        return drawAdaptiveCounts(probs, self.minParticles, self.maxParticles,
+                                  self.kldError, self.kldQuantile, self.rng)
+
+    def compress(self, particles, counts=None):
+        """
+        Store an (N, numGhosts) array of particles as distinct tuples and
+        counts, dropping tuples whose count is 0.
+        """
+        if counts is not None:
+            particles, counts = particles[counts > 0], counts[counts > 0]
+        numCells = len(self.cells)
+        if numCells ** self.numGhosts < 2 ** 62:
+            # One int per tuple, in the same order, is much faster to sort
+            keys = np.zeros(len(particles), dtype=np.int64)
+            for i in range(self.numGhosts):
+                keys = keys * numCells + particles[:, i]
+            keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            particles = particles[first]
+        else:
+            particles, inverse = np.unique(particles, axis=0, return_inverse=True)
+        self.particles = particles
+        self.counts = np.bincount(inverse.ravel(), weights=counts,
+                                  minlength=len(particles)).astype(int)
+
+    def initializeUniformly(self, gameState):
+        self.numParticles = self.maxParticles
+        ArrayJointParticleFilter.initializeUniformly(self, gameState)
+        self.compress(self.particles)
+
+    def observeUpdate(self, observation, gameState):
+        """
+        Resample counts for the distinct tuples from their reweighted counts,
+        or fall back to drawing each ghost's column from its own reweighted
+        histogram when the effective sample size of the joint weights falls
+        below factoredThreshold times the particle count.
+        """
+        pacmanPosition = gameState.getPacmanPosition()
+        table = np.stack([self.getObservationVector(observation[i], pacmanPosition, i)
+                          for i in range(self.numGhosts)])
+        tupleLikelihoods = table[np.arange(self.numGhosts), self.particles]
+        weights = tupleLikelihoods.prod(axis=1)
+        total = np.dot(self.counts, weights)
+        if total > 0:
+            effectiveSize = total ** 2 / np.dot(self.counts, weights ** 2)
+            if effectiveSize >= self.factoredThreshold * self.counts.sum():
+                self.compress(self.particles, self.drawCounts(self.counts * weights / total))
+                return
+        columns = []
+        for i in range(self.numGhosts):
+            histogram = np.bincount(self.particles[:, i], weights=self.counts * tupleLikelihoods[:, i],
+                                    minlength=len(self.cells))
+            if histogram.sum() == 0:
+                histogram = table[i]
+            if histogram.sum() == 0:
+                histogram = np.zeros(len(self.cells))
+                histogram[:len(self.legalPositions)] = 1.0
+            columns.append(self.drawCounts(histogram / histogram.sum()))
+        self.numParticles = max([column.sum() for column in columns])
+        particles = np.stack([self.rng.permutation(np.repeat(np.arange(len(self.cells)), column))
+                              [self.rng.integers(column.sum(), size=self.numParticles)]
+                              for column in columns], axis=1)
+        self.compress(particles)
+
+    def elapseTime(self, gameState):
+        """
+        Move the ghosts one at a time.  The count of every distinct tuple
+        (with the ghosts before i already moved) is split over the
+        successors of ghost i with one multinomial draw, as
+        AdaptiveParticleFilter splits the count of a cell, so the cost grows
+        with the distinct tuples rather than with the particles.
+        """
+        if not self.isFactored():
+            self.compress(self.moveJointly(gameState, self.particles, self.counts))
+            return
+        particles, counts = self.particles, self.counts
+        for i in range(self.numGhosts):
+            successors, cdfs = self.getTransitionMatrix(gameState, i).getSamplingTables()
+            cells = particles[:, i]
+            pvals = np.diff(cdfs[cells], axis=1, prepend=0.0)
+            draws = self.rng.multinomial(counts, pvals)
+            tuples, slots = np.nonzero(draws)
+            particles = particles[tuples]
+            particles[:, i] = successors[cells[tuples], slots]
+            counts = draws[tuples, slots]
+        self.compress(particles, counts)
+
+    def getParticleCount(self):
+        return int(self.counts.sum())
+
+    def getBeliefDistribution(self):
+        positions = self.cells.positions
+        dist = inference.DiscreteDistribution()
+        for row, count in zip(self.particles.tolist(), self.counts.tolist()):
+            dist[tuple([positions[cellId] for cellId in row])] = count
+        dist.normalize()
+        return dist
+
+    def getMarginalDistribution(self, ghostIndex):
+        beliefs = np.bincount(self.particles[:, ghostIndex], weights=self.counts,
+                              minlength=len(self.cells))
+        return self.cells.toDistribution(beliefs / float(self.counts.sum()))
+
+
+# One joint filter of each kind is shared globally across instances of
+# ArrayMarginalInference and AdaptiveMarginalInference respectively
+jointInference = ArrayJointParticleFilter()
+adaptiveJointInference = AdaptiveJointParticleFilter()
+
+
+class ArrayMarginalInference(inference.MarginalInference):
+    """
+    MarginalInference backed by the shared ArrayJointParticleFilter in this
+    module.
+    """
+    def getJointInference(self):
+        return jointInference
+
+    def initializeUniformly(self, gameState):
+        if self.index == 1:
+            self.getJointInference().randomStream = self.randomStream
+            self.getJointInference().initialize(gameState, self.legalPositions)
+        self.getJointInference().addGhostAgent(self.ghostAgent)
+
+    def observe(self, gameState):
+        if self.index == 1:
+            self.getJointInference().observe(gameState)
+
+    def elapseTime(self, gameState):
+        if self.index == 1:
+            self.getJointInference().elapseTime(gameState)
+
+    def getBeliefDistribution(self):
+        return self.getJointInference().getMarginalDistribution(self.index - 1)
+
+
+class AdaptiveMarginalInference(ArrayMarginalInference):
+    """
+    MarginalInference backed by the shared AdaptiveJointParticleFilter in
+    this module.
+    """
+    def getJointInference(self):
+        return adaptiveJointInference
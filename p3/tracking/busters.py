@@ -27,7 +27,7 @@ from game import Actions
 from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
-import sys, util, types, time, random, layout, os
+import sys, util, types, time, random, layout, os, math
 
 ########################################
 # Parameters for noisy sensor readings #
@@ -39,23 +39,78 @@ SONAR_NOISE_VALUES = [i - SONAR_MAX for i in range(SONAR_NOISE_RANGE)]
 SONAR_DENOMINATOR = 2 ** SONAR_MAX  + 2 ** (SONAR_MAX + 1) - 2.0
 SONAR_NOISE_PROBS = [2 ** (SONAR_MAX-abs(v)) / SONAR_DENOMINATOR  for v in SONAR_NOISE_VALUES]
 
-def getNoisyDistance(pos1, pos2):
+def getNoisyDistance(pos1, pos2, randomStream=None):
+    """
+    A sonar reading of the distance from pos1 to pos2, with noise drawn from
+    randomStream (a random.Random; the random module if None).
+    """
     if pos2[1] == 1: return None
     distance = util.manhattanDistance(pos1, pos2)
-    return max(0, distance + util.sample(SONAR_NOISE_PROBS, SONAR_NOISE_VALUES))
+    return max(0, distance + util.sample(SONAR_NOISE_PROBS, SONAR_NOISE_VALUES, randomStream))
+
+observationTable = []
+logObservationTable = []
+def getObservationTable(maxTrueDistance):
+    """
+    Returns a dense table whose [noisyDistance][trueDistance] entry is
+    P( noisyDistance | trueDistance ), covering at least true distances up to
+    maxTrueDistance and every noisy reading they can produce.  The table is
+    built once from SONAR_NOISE_VALUES and SONAR_NOISE_PROBS and only rebuilt
+    (at twice the size) when a larger distance is asked for.
+    """
+    global observationTable, logObservationTable
+    if len(observationTable) == 0 or maxTrueDistance >= len(observationTable[0]):
+        numTrue = max(2 * len(observationTable[0]) if observationTable else 32, maxTrueDistance + 1)
+        numNoisy = numTrue + int(SONAR_MAX)
+        table = [[0.0] * numTrue for noisyDistance in range(numNoisy)]
+        for noisyDistance in range(numNoisy):
+            for error, prob in zip(SONAR_NOISE_VALUES, SONAR_NOISE_PROBS):
+                trueDistance = int(max(1, noisyDistance - error))
+                if trueDistance < numTrue:
+                    table[noisyDistance][trueDistance] += prob
+        observationTable = table
+        logObservationTable = [[math.log(p) if p > 0 else -float('inf') for p in row]
+                               for row in table]
+    return observationTable
+
+def getLogObservationTable(maxTrueDistance):
+    """
+    Returns the table of getObservationTable with every entry replaced by its
+    natural log (-inf for impossible readings), for filters that accumulate
+    evidence over long horizons without underflowing.
+    """
+    getObservationTable(maxTrueDistance)
+    return logObservationTable
 
-observationDistributions = {}
 def getObservationProbability(noisyDistance, trueDistance):
     """
     Returns the probability P( noisyDistance | trueDistance ).
     """
-    global observationDistributions
-    if noisyDistance not in observationDistributions:
-        distribution = util.Counter()
-        for error , prob in zip(SONAR_NOISE_VALUES, SONAR_NOISE_PROBS):
-            distribution[max(1, noisyDistance - error)] += prob
-        observationDistributions[noisyDistance] = distribution
-    return observationDistributions[noisyDistance][trueDistance]
+    # Distances may be stored as floats; only whole distances have readings
+    if noisyDistance != int(noisyDistance) or trueDistance != int(trueDistance):
+        return 0.0
+    noisyDistance, trueDistance = int(noisyDistance), int(trueDistance)
+    table = getObservationTable(max(trueDistance, noisyDistance))
+    return table[noisyDistance][trueDistance]
+
+distanceFields = {}
+def getDistanceField(pacmanPosition, width, height):
+    """
+    Returns a width x height list of lists whose [x][y] entry is the Manhattan
+    distance from pacmanPosition to (x, y).  Fields are cached per position,
+    so an observation update over every cell is one lookup per cell:
+
+    row = getObservationTable(width + height)[noisyDistance]
+    field = getDistanceField(pacmanPosition, width, height)
+    likelihoods = [row[field[x][y]] for x, y in positions]
+    """
+    key = (pacmanPosition, width, height)
+    if key not in distanceFields:
+        if len(distanceFields) >= 4096: distanceFields.clear()
+        px, py = pacmanPosition
+        distanceFields[key] = [[abs(x - px) + abs(y - py) for y in range(height)]
+                               for x in range(width)]
+    return distanceFields[key]
 
 ###################################################
 # YOUR INTERFACE TO THE PACMAN WORLD: A GameState #
@@ -121,7 +176,7 @@ class GameState:
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
         p = state.getPacmanPosition()
-        state.data.ghostDistances = [getNoisyDistance(p, state.getGhostPosition(i)) for i in range(1,state.getNumAgents())]
+        state.data.ghostDistances = [getNoisyDistance(p, state.getGhostPosition(i), state.randomStream) for i in range(1,state.getNumAgents())]
         if agentIndex == self.getNumAgents() - 1:
             state.numMoves += 1
         return state
@@ -233,10 +288,12 @@ class GameState:
             self.livingGhosts = prevState.livingGhosts[:]
             self.numMoves = prevState.numMoves;
             self.maxMoves = prevState.maxMoves;
+            self.randomStream = prevState.randomStream
         else: # Initial state
             self.data = GameStateData()
             self.numMoves = 0;
             self.maxMoves = -1;
+            self.randomStream = None # The sonar noise source; None for the random module
         self.data.ghostDistances = []
 
     def deepCopy( self ):
@@ -269,7 +326,7 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
         self.livingGhosts = [False] + [True for i in range(numGhostAgents)]
-        self.data.ghostDistances = [getNoisyDistance(self.getPacmanPosition(), self.getGhostPosition(i)) for i in range(1, self.getNumAgents())]
+        self.data.ghostDistances = [getNoisyDistance(self.getPacmanPosition(), self.getGhostPosition(i), self.randomStream) for i in range(1, self.getNumAgents())]
 
     def getGhostPosition( self, agentIndex ):
         if agentIndex == 0:
@@ -296,9 +353,10 @@ class BustersGameRules:
     and how the game starts and ends.
     """
 
-    def newGame( self, layout, pacmanAgent, ghostAgents, display, maxMoves= -1 ):
+    def newGame( self, layout, pacmanAgent, ghostAgents, display, maxMoves= -1, randomStream=None ):
         agents = [pacmanAgent] + ghostAgents
         initState = GameState()
+        initState.randomStream = randomStream
         initState.initialize( layout, len(ghostAgents))
         game = Game(agents, display, self)
         game.state = initState
@@ -119,7 +119,7 @@ class BustersKeyboardAgent(BustersAgent, KeyboardAgent):
     def chooseAction(self, gameState):
         return KeyboardAgent.getAction(self, gameState)
 
-from distanceCalculator import Distancer
+from distanceCalculator import getMazeDistances
 from game import Actions
 from game import Directions
 
@@ -127,9 +127,9 @@ class GreedyBustersAgent(BustersAgent):
     "An agent that charges the closest ghost."
 
     def registerInitialState(self, gameState):
-        "Pre-computes the distance between every two points."
+        "Uses the maze distances shared by every agent on the layout."
         BustersAgent.registerInitialState(self, gameState)
-        self.distancer = Distancer(gameState.data.layout, False)
+        self.distancer = getMazeDistances(gameState.data.layout)
 
     def chooseAction(self, gameState):
         """
@@ -0,0 +1,168 @@
+# bustersBatch.py
+# ---------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Headless busters games in parallel, each with its own random streams.
+
+The game rules, the ghosts, the sonar and the inference modules draw from the
+global random module unless given a random.Random of their own.  Here every
+game's rules (which also make the sonar readings), each of its ghosts and
+each of Pacman's inference modules get a separate random.Random, seeded from
+(seed, game number, component) alone, so a game's outcome does not depend on
+which worker plays it or in what order.  Modules that keep a NumPy Generator
+(those in arrayInference.py) seed it from their stream, so they are covered
+too.
+
+Results are printed as the games finish, followed by a GameScoreTest-style
+summary: the games won with at least --minScore points must number at least
+--winsForCredit.
+
+python bustersBatch.py -l bigHunt -k 4 -n 100 -j 8 -a inference=ParticleFilter
+"""
+
+import __main__
+import multiprocessing
+import random
+import sys
+import time
+
+import busters
+import bustersAgents
+import layout
+from trackingBatch import loadGhostType
+
+def getStreamSeed(seed, gameNumber, component):
+    """
+    The seed of one component's stream in one game, where component is
+    'rules', 'ghost<index>' or 'inference<number>'.  String seeds are hashed
+    the same way in every process.
+    """
+    return '%s/%d/%s' % (seed, gameNumber, component)
+
+def getStream(seed, gameNumber, component):
+    return random.Random(getStreamSeed(seed, gameNumber, component))
+
+def playGame(task):
+    """
+    Play game number gameNumber headlessly and return (gameNumber, score,
+    win, moves, seconds).
+    """
+    layoutName, numGhosts, ghostType, pacmanType, agentArgs, maxMoves, seed, gameNumber = task
+    start = time.perf_counter()
+    lay = layout.getLayout(layoutName)
+    ghostClass = loadGhostType(ghostType)
+    ghosts = [ghostClass(i + 1) for i in range(min(numGhosts, lay.getNumGhosts()))]
+    for ghost in ghosts:
+        ghost.randomStream = getStream(seed, gameNumber, 'ghost%d' % ghost.index)
+    pacman = getattr(bustersAgents, pacmanType)(ghostAgents=ghosts, **agentArgs)
+    for i, module in enumerate(pacman.inferenceModules):
+        module.randomStream = getStream(seed, gameNumber, 'inference%d' % (i + 1))
+    display = bustersAgents.NullGraphics()
+    # BustersAgent finds the display here, as set up by busters.runGames
+    __main__.__dict__['_display'] = display
+    rules = busters.BustersGameRules()
+    game = rules.newGame(lay, pacman, ghosts, display, maxMoves,
+                         getStream(seed, gameNumber, 'rules'))
+    game.run()
+    state = game.state
+    return (gameNumber, state.getScore(), state.isWin(), state.numMoves,
+            time.perf_counter() - start)
+
+def summarize(results, minScore, winsForCredit):
+    """
+    Return the GameScoreTest-style statistics of a list of playGame results.
+    """
+    scores = [score for gameNumber, score, win, moves, seconds in results]
+    wins = [win for gameNumber, score, win, moves, seconds in results]
+    aboveCount = [win and score >= minScore for score, win in zip(scores, wins)].count(True)
+    return {'games': len(results), 'wins': wins.count(True),
+            'averageScore': sum(scores) / float(max(len(scores), 1)),
+            'aboveCount': aboveCount, 'passed': aboveCount >= winsForCredit,
+            'seconds': sum([result[-1] for result in results])}
+
+def runBatch(layoutName, numGames, numGhosts=4, ghostType='RandomGhost',
+             pacmanType='GreedyBustersAgent', agentArgs={}, maxMoves=-1, seed=0,
+             numWorkers=None, minScore=0, winsForCredit=0, out=sys.stdout):
+    """
+    Play numGames games in a process pool, writing a CSV row per game to out
+    as it finishes and the summary at the end.  Returns summarize's dict.
+    """
+    tasks = [(layoutName, numGhosts, ghostType, pacmanType, agentArgs, maxMoves, seed, i)
+             for i in range(numGames)]
+    out.write('game,score,win,moves,seconds\n')
+    results = []
+    if numWorkers == 1:
+        outcomes = map(playGame, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(numWorkers, layout.prewarmLayouts, ([layoutName],))
+        outcomes = pool.imap_unordered(playGame, tasks)
+    try:
+        for result in outcomes:
+            results.append(result)
+            out.write('%d,%d,%s,%d,%.3f\n' % result)
+            out.flush()
+    finally:
+        if pool != None:
+            pool.close()
+            pool.join()
+    results.sort()
+    stats = summarize(results, minScore, winsForCredit)
+    out.write('*** Won %d out of %d games. Average score: %f ***\n'
+              % (stats['wins'], stats['games'], stats['averageScore']))
+    out.write('*** Games won with score above %d: %d/%d (%s) ***\n'
+              % (minScore, stats['aboveCount'], stats['games'],
+                 ['FAIL', 'PASS'][int(stats['passed'])]))
+    return stats
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python bustersBatch.py <options>
+    EXAMPLE:    python bustersBatch.py -l smallHunt -k 2 -n 50 -a inference=ExactInference
+                  - plays 50 seeded games of GreedyBustersAgent on smallHunt
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-l', '--layout', dest='layout', default='smallHunt',
+                      help='layout to play on [Default: %default]')
+    parser.add_option('-n', '--numGames', type='int', dest='numGames', default=10,
+                      help='number of games [Default: %default]')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=4,
+                      help='maximum number of ghosts [Default: %default]')
+    parser.add_option('-g', '--ghosts', dest='ghostType', default='RandomGhost',
+                      help='ghost agent type [Default: %default]')
+    parser.add_option('-p', '--pacman', dest='pacmanType', default='GreedyBustersAgent',
+                      help='Pacman agent type in bustersAgents.py [Default: %default]')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs', default=None,
+                      help='comma separated arguments for the Pacman agent, e.g. "inference=ParticleFilter"')
+    parser.add_option('-m', '--maxMoves', type='int', dest='maxMoves', default=-1,
+                      help='moves before a game is lost; unlimited if negative [Default: %default]')
+    parser.add_option('-s', '--seed', dest='seed', default='0',
+                      help='seed of the whole batch [Default: %default]')
+    parser.add_option('-j', '--workers', type='int', dest='numWorkers', default=None,
+                      help='number of worker processes; all cores if omitted')
+    parser.add_option('--minScore', type='int', dest='minScore', default=0,
+                      help='score a win needs to count for credit [Default: %default]')
+    parser.add_option('--winsForCredit', type='int', dest='winsForCredit', default=0,
+                      help='wins above minScore needed to pass [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    runBatch(options.layout, options.numGames, options.numGhosts, options.ghostType,
+             options.pacmanType, busters.parseAgentArgs(options.agentArgs), options.maxMoves,
+             options.seed, options.numWorkers, options.minScore, options.winsForCredit)
@@ -16,16 +16,30 @@ import ghostAgents
 from game import Directions
 from game import Actions
 from util import manhattanDistance
+from distanceCalculator import getMazeDistances
 import util
 
 class StationaryGhost( ghostAgents.GhostAgent ):
+    ignoresPacman = True
     def getDistribution( self, state ):
         dist = util.Counter()
         dist[Directions.STOP] = 1.0
         return dist
 
+class MazeDirectionalGhost( ghostAgents.DirectionalGhost ):
+    """
+    A DirectionalGhost that ranks its moves by maze distance to Pacman, read
+    from the distances shared by every agent and inference module on the
+    layout.  Inference modules tracking it get the same maze-aware
+    transition model through getDistribution.
+    """
+    def getDistance( self, state, pos1, pos2 ):
+        return getMazeDistances( state.data.layout ).getDistance( pos1, pos2 )
+
 class DispersingGhost( ghostAgents.GhostAgent ):
     "Chooses an action that distances the ghost from the other ghosts with probability spreadProb."
+    isStationary = False  # Its moves depend on the other ghosts' cells
+
     def __init__( self, index, spreadProb=0.5):
         self.index = index
         self.spreadProb = spreadProb
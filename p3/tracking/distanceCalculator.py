@@ -143,43 +143,19 @@ class DistanceCalculator(threading.Thread):
     self.distancer._distances = distances
 
 def computeDistances(layout):
+    """
+    Return a dict from every (target, source) pair of open cells to their maze
+    distance, searched with the layout's shared Pathfinder.  The fields are
+    not added to the Pathfinder's cache, since the table returned already
+    holds all of them.  Unreachable pairs get 1000000000.
+    """
     distances = {}
     allNodes = layout.walls.asList(False)
+    pathfinder = layout.getPathfinder()
     for source in allNodes:
-        dist = {}
-        closed = {}
-        for node in allNodes:
-            dist[node] = 1000000000
-        import util
-        queue = util.PriorityQueue()
-        queue.push(source, 0)
-        dist[source] = 0
-        while not queue.isEmpty():
-            node = queue.pop()
-            if node in closed:
-                continue
-            closed[node] = True
-            nodeDist = dist[node]
-            adjacent = []
-            x, y = node
-            if not layout.isWall((x,y+1)):
-                adjacent.append((x,y+1))
-            if not layout.isWall((x,y-1)):
-                adjacent.append((x,y-1) )
-            if not layout.isWall((x+1,y)):
-                adjacent.append((x+1,y) )
-            if not layout.isWall((x-1,y)):
-                adjacent.append((x-1,y))
-            for other in adjacent:
-                if not other in dist:
-                    continue
-                oldDist = dist[other]
-                newDist = nodeDist+1
-                if newDist < oldDist:
-                    dist[other] = newDist
-                    queue.push(other, newDist)
+        dist = pathfinder.computeDistanceField(source)
         for target in allNodes:
-            distances[(target, source)] = dist[target]
+            distances[(target, source)] = dist.get(target, 1000000000)
     return distances
 
 
@@ -189,3 +165,59 @@ def getDistanceOnGrid(distances, pos1, pos2):
       return distances[key]
     return 100000
 
+
+###########################################
+# MAZE DISTANCES SHARED ACROSS THE PROCESS #
+###########################################
+
+mazeDistanceMap = {}
+mazeDistanceLock = threading.Lock()
+
+class MazeDistances:
+    """
+    Maze distances on one layout, read from the distance fields of the
+    layout's shared Pathfinder.  Each field is computed the first time its
+    source is asked about and kept while it is among the Pathfinder's most
+    recently used, so agents, ghosts and inference modules that share a
+    MazeDistances rarely repeat a search.
+
+    getDistance takes the same (possibly fractional) positions as
+    Distancer.getDistance and returns default for cells that cannot reach
+    each other.
+    """
+    def __init__(self, layout, default=10000):
+        self.pathfinder = layout.getPathfinder()
+        self.default = default
+
+    def getDistance(self, pos1, pos2):
+        if isInt(pos1) and isInt(pos2):
+            return self.getDistanceOnGrid(pos1, pos2)
+        bestDistance = self.default
+        for pos1Snap, snap1Distance in getGrids2D(pos1):
+            for pos2Snap, snap2Distance in getGrids2D(pos2):
+                distance = self.getDistanceOnGrid(pos1Snap, pos2Snap) + snap1Distance + snap2Distance
+                if bestDistance > distance:
+                    bestDistance = distance
+        return bestDistance
+
+    def getDistanceOnGrid(self, pos1, pos2):
+        pos1 = (int(pos1[0]), int(pos1[1]))
+        pos2 = (int(pos2[0]), int(pos2[1]))
+        return self.pathfinder.getDistanceField(pos1).get(pos2, self.default)
+
+    def isReadyForMazeDistance(self):
+        return True
+
+def getMazeDistances(layout):
+    """
+    Return the MazeDistances for layout, shared by every caller in the
+    process with a layout of the same text.
+    """
+    key = layout.getContentHash()
+    mazeDistanceLock.acquire()
+    try:
+        if key not in mazeDistanceMap:
+            mazeDistanceMap[key] = MazeDistances(layout)
+        return mazeDistanceMap[key]
+    finally:
+        mazeDistanceLock.release()
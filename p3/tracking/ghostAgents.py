@@ -20,6 +20,8 @@ from util import manhattanDistance
 import util
 
 class GhostAgent( Agent ):
+    randomStream = random # Set to a random.Random to give the ghost its own draws
+
     def __init__( self, index ):
         self.index = index
 
@@ -28,7 +30,7 @@ class GhostAgent( Agent ):
         if len(dist) == 0:
             return Directions.STOP
         else:
-            return util.chooseFromDistribution( dist )
+            return util.chooseFromDistribution( dist, self.randomStream )
 
     def getDistribution(self, state):
         "Returns a Counter encoding a distribution over actions from the provided state."
@@ -36,6 +38,7 @@ class GhostAgent( Agent ):
 
 class RandomGhost( GhostAgent ):
     "A ghost that chooses a legal action uniformly at random."
+    ignoresPacman = True  # Its moves depend only on its own cell
     def getDistribution( self, state ):
         dist = util.Counter()
         for a in state.getLegalActions( self.index ): dist[a] = 1.0
@@ -64,7 +67,7 @@ class DirectionalGhost( GhostAgent ):
         pacmanPosition = state.getPacmanPosition()
 
         # Select best actions given the state
-        distancesToPacman = [manhattanDistance( pos, pacmanPosition ) for pos in newPositions]
+        distancesToPacman = [self.getDistance( state, pos, pacmanPosition ) for pos in newPositions]
         if isScared:
             bestScore = max( distancesToPacman )
             bestProb = self.prob_scaredFlee
@@ -79,3 +82,7 @@ class DirectionalGhost( GhostAgent ):
         for a in legalActions: dist[a] += ( 1-bestProb ) / len(legalActions)
         dist.normalize()
         return dist
+
+    def getDistance( self, state, pos1, pos2 ):
+        "The distance the ghost uses to rank its moves."
+        return manhattanDistance( pos1, pos2 )
@@ -12,6 +12,7 @@
 # Pieter Abbeel (pabbeel@cs.berkeley.edu).
 
 
+import collections
 import itertools
 import random
 import busters
@@ -24,10 +25,81 @@ class DiscreteDistribution(dict):
     """
     A DiscreteDistribution models belief distributions and weight distributions
     over a finite set of discrete keys.
+
+    Reading a missing key returns 0 without storing it.  The total is cached
+    until the next change.  The first draw after a change scans the values;
+    any further draw builds an alias table, after which every draw is O(1).
     """
-    def __getitem__(self, key):
-        self.setdefault(key, 0)
-        return dict.__getitem__(self, key)
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.changed()
+
+    def __missing__(self, key):
+        return 0
+
+    def changed(self):
+        """
+        Forget the cached total and alias table.
+        """
+        self.cachedTotal = None
+        self.aliasTable = None
+        self.sampledSinceChange = False
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        # changed(), inlined since this runs for every update
+        self.cachedTotal = self.aliasTable = None
+        self.sampledSinceChange = False
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.changed()
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.changed()
+
+    def setdefault(self, key, default=None):
+        self.changed()
+        return dict.setdefault(self, key, default)
+
+    def pop(self, *args):
+        self.changed()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.changed()
+        return dict.popitem(self)
+
+    def clear(self):
+        dict.clear(self)
+        self.changed()
+
+    def __ior__(self, other):
+        dict.update(self, other)
+        self.changed()
+        return self
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        result = self.copy()
+        result |= other
+        return result
+
+    def __ror__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        result = DiscreteDistribution(other)
+        result |= self
+        return result
+
+    @classmethod
+    def fromkeys(cls, keys, value=None):
+        distribution = cls()
+        for key in keys:
+            distribution[key] = value
+        return distribution
 
     def copy(self):
         """
@@ -50,7 +122,9 @@ class DiscreteDistribution(dict):
         """
         Return the sum of values for all keys.
         """
-        return float(sum(self.values()))
+        if self.cachedTotal == None:
+            self.cachedTotal = float(sum(self.values()))
+        return self.cachedTotal
 
     def normalize(self):
         """
@@ -74,18 +148,19 @@ class DiscreteDistribution(dict):
         >>> empty
         {}
         """
-        if self.total() == 0:
-            return
-
         total = self.total()
-        for (key, value) in self.items():
-            self[key] = value/total
-            
+        if total == 0:
+            return
+        for key, value in self.items():
+            dict.__setitem__(self, key, value / total)
+        self.changed()
 
-    def sample(self):
+    def sample(self, n=None, randomStream=None):
         """
         Draw a random sample from the distribution and return the key, weighted
-        by the values associated with each key.
+        by the values associated with each key.  With n, return a list of n
+        independent samples instead.  Draws come from randomStream, a
+        random.Random, or from the random module if it is None.
 
         >>> dist = DiscreteDistribution()
         >>> dist['a'] = 1
@@ -102,20 +177,131 @@ class DiscreteDistribution(dict):
         0.4
         >>> round(samples.count('d') * 1.0/N, 1)
         0.0
-        """
-        rdm = random.random()
-        n = rdm * self.total()
-        for (key, value) in self.items():
-            self[key] = value
-            n -= value
-            if n <= 0:
+        >>> len(dist.sample(10))
+        10
+        """
+        if randomStream == None:
+            randomStream = random
+        if self.aliasTable == None:
+            if n == None and not self.sampledSinceChange:
+                # A single draw is cheaper as a scan than as a table
+                self.sampledSinceChange = True
+                return self.sampleByScan(randomStream)
+            self.aliasTable = self.buildAliasTable()
+        keys, probs, aliases = self.aliasTable
+        if len(keys) == 0:
+            return None if n == None else [None] * n
+        if n != None:
+            return [self.drawFromAliasTable(keys, probs, aliases, randomStream) for _ in range(n)]
+        return self.drawFromAliasTable(keys, probs, aliases, randomStream)
+
+    def sampleByScan(self, randomStream=random):
+        remaining = randomStream.random() * self.total()
+        for key, value in self.items():
+            remaining -= value
+            if remaining <= 0:
                 return key
+        return key if len(self) > 0 else None
+
+    def buildAliasTable(self):
+        """
+        Return Vose's alias table (keys, probs, aliases) over the keys with
+        positive value.  Every slot i holds keys[i] with probability probs[i]
+        and keys[aliases[i]] otherwise.  If every value is 0, the table holds
+        the first key alone.
+        """
+        keys = [key for key, value in self.items() if value > 0]
+        if len(keys) == 0:
+            keys = list(self.keys())[:1]
+            return keys, [1.0] * len(keys), [0] * len(keys)
+        total = self.total()
+        scaled = [self[key] * len(keys) / total for key in keys]
+        aliases = list(range(len(keys)))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            aliases[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever is left is 1 up to rounding
+        for i in small + large:
+            scaled[i] = 1.0
+        return keys, scaled, aliases
+
+    @staticmethod
+    def drawFromAliasTable(keys, probs, aliases, randomStream=random):
+        i = int(randomStream.random() * len(keys))
+        if randomStream.random() < probs[i]:
+            return keys[i]
+        return keys[aliases[i]]
+
+
+def isWhole(value):
+    "Whether a distance or coordinate, possibly a float, is a whole number"
+    return value == int(value)
+
+
+class TransitionKernelCache:
+    """
+    A least-recently-used cache of ghost transition kernels, the
+    distributions returned by InferenceModule.getPositionDistribution.
+
+    Keys are built by InferenceModule.getKernelKey.  Once maxSize kernels are
+    stored, adding another evicts the one used longest ago.
+    """
+    def __init__(self, maxSize=4096):
+        self.maxSize = maxSize
+        self.kernels = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Return the kernel stored under key, or None.
+        """
+        kernel = self.kernels.get(key)
+        if kernel is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.kernels.move_to_end(key)
+        return kernel
+
+    def put(self, key, kernel):
+        self.kernels[key] = kernel
+        self.kernels.move_to_end(key)
+        if len(self.kernels) > self.maxSize:
+            self.kernels.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Drop every stored kernel.
+        """
+        self.kernels.clear()
+
+    def __len__(self):
+        return len(self.kernels)
 
 
 class InferenceModule:
     """
     An inference module tracks a belief distribution over a ghost's location.
+
+    Transition kernels are cached in a TransitionKernelCache.  A ghost agent
+    whose policy depends on anything besides its own cell and Pacman's cell,
+    such as the other ghosts' cells, must set isStationary = False, which
+    disables the cache for it; invalidateKernels clears the cache explicitly.
+
+    Particle filters sample from randomStream, which may be set to a
+    random.Random of the module's own.
     """
+    maxCachedKernels = 4096
+    randomStream = random
+
     ############################################
     # Useful methods for all inference modules #
     ############################################
@@ -167,12 +353,47 @@ class InferenceModule:
         Return a distribution over successor positions of the ghost from the
         given gameState. You must first place the ghost in the gameState, using
         setGhostPosition below.
+
+        Kernels of stationary agents are computed once per key and served from
+        the cache afterwards, without touching gameState.  Cached kernels are
+        shared, so that repeated draws reuse one alias table; callers must not
+        modify them.
         """
         if index == None:
             index = self.index - 1
         if agent == None:
             agent = self.ghostAgent
-        return self.getPositionDistributionHelper(gameState, pos, index, agent)
+        if not getattr(agent, 'isStationary', True):
+            return self.getPositionDistributionHelper(gameState, pos, index, agent)
+        cache = self.getKernelCache()
+        key = self.getKernelKey(gameState, pos, index, agent)
+        kernel = cache.get(key)
+        if kernel is None:
+            kernel = self.getPositionDistributionHelper(gameState, pos, index, agent)
+            cache.put(key, kernel)
+        return kernel
+
+    def getKernelKey(self, gameState, pos, index, agent):
+        """
+        Return the inputs a stationary ghost policy depends on: the agent, the
+        ghost's cell and Pacman's cell.  pos is a list of every ghost's
+        position when called from a joint filter.  The ghost is never scared
+        here, as setGhostPosition places it with a fresh AgentState.
+        """
+        ghostPosition = pos[index] if isinstance(pos, list) else pos
+        return (agent, index, ghostPosition, gameState.getPacmanPosition())
+
+    def getKernelCache(self):
+        if not hasattr(self, 'kernelCache'):
+            self.kernelCache = TransitionKernelCache(self.maxCachedKernels)
+        return self.kernelCache
+
+    def invalidateKernels(self):
+        """
+        Forget every cached transition kernel.  Call this whenever a ghost's
+        policy changes; initialize calls it for every new game.
+        """
+        self.getKernelCache().invalidate()
 
     def getObservationProb(self, noisyDistance, pacmanPosition, ghostPosition, jailPosition):
         """
@@ -188,6 +409,35 @@ class InferenceModule:
             return 0.0
         return busters.getObservationProbability(noisyDistance, manhattanDistance(pacmanPosition, ghostPosition))
 
+    def getObservationProbs(self, noisyDistance, gameState, positions, jailPosition):
+        """
+        Return getObservationProb for every position in positions as a list,
+        gathered from one row of busters' observation table through Pacman's
+        distance field.
+        """
+        if noisyDistance == None:
+            return [1.0 if pos == jailPosition else 0.0 for pos in positions]
+        pacmanPosition = gameState.getPacmanPosition()
+        if not isWhole(noisyDistance) or not isWhole(pacmanPosition[0]) or not isWhole(pacmanPosition[1]):
+            return [self.getObservationProb(noisyDistance, pacmanPosition, pos, jailPosition)
+                    for pos in positions]
+        walls = gameState.getWalls()
+        noisyDistance = int(noisyDistance)
+        row = busters.getObservationTable(max(walls.width + walls.height, noisyDistance))[noisyDistance]
+        pacmanCell = (int(pacmanPosition[0]), int(pacmanPosition[1]))
+        field = busters.getDistanceField(pacmanCell, walls.width, walls.height)
+        probs = []
+        for pos in positions:
+            x, y = pos
+            if pos == jailPosition:
+                probs.append(0.0)
+            elif isWhole(x) and isWhole(y):
+                # Successor positions may hold whole floats
+                probs.append(row[field[int(x)][int(y)]])
+            else:
+                probs.append(self.getObservationProb(noisyDistance, pacmanPosition, pos, jailPosition))
+        return probs
+
     def setGhostPosition(self, gameState, ghostPosition, index):
         """
         Set the position of the ghost for this inference module to the specified
@@ -231,6 +481,7 @@ class InferenceModule:
         """
         self.legalPositions = [p for p in gameState.getWalls().asList(False) if p[1] > 1]
         self.allPositions = self.legalPositions + [self.getJailPosition()]
+        self.invalidateKernels()
         self.initializeUniformly(gameState)
 
     ######################################
@@ -294,8 +545,8 @@ class ExactInference(InferenceModule):
         position is known.
         """
         "*** YOUR CODE HERE ***"
-        for pos in self.allPositions:
-            obs = self.getObservationProb(observation, gameState.getPacmanPosition(), pos, self.getJailPosition())
+        probs = self.getObservationProbs(observation, gameState, self.allPositions, self.getJailPosition())
+        for pos, obs in zip(self.allPositions, probs):
             self.beliefs[pos] = self.beliefs[pos] * obs
         self.beliefs.normalize()
 
@@ -363,14 +614,15 @@ class ParticleFilter(InferenceModule):
         the DiscreteDistribution may be useful.
         """
         d = DiscreteDistribution()
-        for pos in self.particles:
-            d[pos] += self.getObservationProb(observation, gameState.getPacmanPosition(), pos, self.getJailPosition())
+        probs = self.getObservationProbs(observation, gameState, self.particles, self.getJailPosition())
+        for pos, prob in zip(self.particles, probs):
+            d[pos] += prob
         
         if d.total() == 0:
             self.initializeUniformly(gameState)
         else:
             for i in range(0, self.numParticles):
-                self.particles[i] = d.sample()
+                self.particles[i] = d.sample(randomStream=self.randomStream)
 
     def elapseTime(self, gameState):
         """
@@ -379,7 +631,7 @@ class ParticleFilter(InferenceModule):
         """
         for i in range(len(self.particles)):
             newpos = self.getPositionDistribution(gameState, self.particles[i])
-            self.particles[i] = newpos.sample()
+            self.particles[i] = newpos.sample(randomStream=self.randomStream)
 
     def getBeliefDistribution(self):
         """
@@ -411,6 +663,7 @@ class JointParticleFilter(ParticleFilter):
         self.numGhosts = gameState.getNumAgents() - 1
         self.ghostAgents = []
         self.legalPositions = legalPositions
+        self.invalidateKernels()
         self.initializeUniformly(gameState)
 
     def initializeUniformly(self, gameState):
@@ -471,7 +724,7 @@ class JointParticleFilter(ParticleFilter):
                 self.initializeUniformly(gameState)
                 return
         for i in range(0, self.numParticles):
-            self.particles[i] = tuple([d[ghost].sample() for ghost in range(self.numGhosts)])
+            self.particles[i] = tuple([d[ghost].sample(randomStream=self.randomStream) for ghost in range(self.numGhosts)])
 
     def elapseTime(self, gameState):
         """
@@ -485,7 +738,7 @@ class JointParticleFilter(ParticleFilter):
             # now loop through and update each entry in newParticle...
             for i in range(self.numGhosts):
                 newpos = self.getPositionDistribution(gameState, list(oldParticle), i, self.ghostAgents[i])
-                newParticle[i] = newpos.sample()
+                newParticle[i] = newpos.sample(randomStream=self.randomStream)
 
             newParticles.append(tuple(newParticle))
         self.particles = newParticles
@@ -505,6 +758,7 @@ class MarginalInference(InferenceModule):
         Set the belief state to an initial, prior value.
         """
         if self.index == 1:
+            jointInference.randomStream = self.randomStream
             jointInference.initialize(gameState, self.legalPositions)
         jointInference.addGhostAgent(self.ghostAgent)
 
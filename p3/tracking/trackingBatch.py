@@ -0,0 +1,279 @@
+# trackingBatch.py
+# ----------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Offline batch tracking over recorded busters episodes.
+
+An episode is recorded headlessly, without a Game or a display: Pacman
+wanders at random and the ghosts follow their agents.  For every step, it
+stores Pacman's position, the noisy distance readings and the true ghost
+positions.  The inference modules are then replayed over the episodes in a
+process pool.  Every module (with its options) is scored by the mean belief
+it puts on each ghost's true cell, and by its time per step.  numParticles
+and the like can thus be tuned without the game loop:
+
+python trackingBatch.py -l smallHunt -k 2 -n 1000 -m 50 -j 8 \\
+    --modules ExactInference,ParticleFilter:numParticles=100,ParticleFilter:numParticles=1000
+
+A module is given as a name that bustersAgents would accept (for example
+MarginalInference or arrayInference.AdaptiveParticleFilter), optionally
+followed by ':' and key=value constructor arguments separated by ';'.
+Episodes can be saved with -o and replayed later with -i.
+"""
+
+import multiprocessing
+import pickle
+import random
+import sys
+import time
+
+import busters
+import bustersGhostAgents
+import game
+import ghostAgents
+import inference
+import layout
+import util
+
+def recordEpisode(layoutName, numGhosts, numMoves, seed, ghostType='RandomGhost'):
+    """
+    Play one headless game and return it as a dict with the layout name, the
+    ghost type and a list of (pacmanPosition, noisyDistances, ghostPositions)
+    steps, one per Pacman move.  The game is drawn from random.seed(seed).
+    """
+    random.seed(seed)
+    lay = layout.getLayout(layoutName)
+    ghosts = [loadGhostType(ghostType)(i + 1) for i in range(numGhosts)]
+    state = busters.GameState()
+    state.initialize(lay, len(ghosts))
+    steps = []
+    while not state.isWin() and len(steps) < numMoves:
+        ghostPositions = tuple([state.getGhostPosition(i + 1) for i in range(len(ghosts))])
+        steps.append((state.getPacmanPosition(), tuple(state.getNoisyGhostDistances()),
+                      ghostPositions))
+        actions = [a for a in state.getLegalPacmanActions() if a != game.Directions.STOP]
+        state = state.getResult(0, random.choice(actions))
+        for ghost in ghosts:
+            if state.isWin(): break
+            state = state.getResult(ghost.index, ghost.getAction(state))
+    return {'layout': layoutName, 'ghostType': ghostType, 'numGhosts': len(ghosts),
+            'seed': seed, 'steps': steps}
+
+def parseModuleSpec(spec):
+    """
+    Split 'name:key=value;key=value' into the name and a dict of arguments,
+    converting numeric values.
+    """
+    name, sep, argString = spec.partition(':')
+    args = {}
+    for pair in [p for p in argString.split(';') if p]:
+        key, value = pair.split('=')
+        for convert in [int, float]:
+            try:
+                value = convert(value)
+                break
+            except ValueError:
+                pass
+        args[key] = value
+    return name, args
+
+def loadGhostType(name):
+    """
+    Return the ghost agent class called name in ghostAgents or
+    bustersGhostAgents.
+    """
+    for module in [ghostAgents, bustersGhostAgents]:
+        if hasattr(module, name): return getattr(module, name)
+    raise Exception('The ghost ' + name + ' is not specified in any ghost agents module.')
+
+def loadModuleType(name):
+    try:
+        return util.lookup(name, globals())
+    except Exception:
+        return util.lookup('inference.' + name, globals())
+
+def checkModules(specs, ghostTypeNames):
+    """
+    Raise an exception naming the first module spec that cannot model one of
+    the ghost types: a ghost whose moves depend on the other ghosts
+    (isStationary = False) can only be tracked by a joint module, one of the
+    MarginalInference family, as per-ghost modules never see the others.
+    """
+    for ghostTypeName in set(ghostTypeNames):
+        if getattr(loadGhostType(ghostTypeName), 'isStationary', True):
+            continue
+        for spec in specs:
+            name, args = parseModuleSpec(spec)
+            if not issubclass(loadModuleType(name), inference.MarginalInference):
+                raise Exception('The module %s tracks each ghost alone, but %s moves by the '
+                                'other ghosts\' positions; use MarginalInference or '
+                                'arrayInference.ArrayMarginalInference instead.'
+                                % (name, ghostTypeName))
+
+def trackEpisode(episode, spec, seed=0, modelGhostType=None):
+    """
+    Replay episode through one inference module per ghost, built from spec,
+    the way BustersAgent.getAction drives them.  The modules model the
+    ghosts as modelGhostType agents, by default the type that played the
+    episode.  Returns (steps, summed belief on the true cells, seconds spent
+    in the modules).
+    """
+    random.seed(seed)
+    name, args = parseModuleSpec(spec)
+    moduleType = loadModuleType(name)
+    ghostType = loadGhostType(modelGhostType or episode['ghostType'])
+    ghosts = [ghostType(i + 1) for i in range(episode['numGhosts'])]
+    modules = [moduleType(ghost, **args) for ghost in ghosts]
+    state = busters.GameState()
+    state.initialize(layout.getLayout(episode['layout']), len(ghosts))
+    pacmanState = state.data.agentStates[0]
+
+    totalBelief, elapsed = 0.0, 0.0
+    for step, (pacmanPosition, distances, ghostPositions) in enumerate(episode['steps']):
+        # Ghost states are hidden from the modules, as by observationFunction
+        pacmanState.configuration = game.Configuration(pacmanPosition, game.Directions.STOP)
+        state.data.agentStates = [pacmanState] + [None for ghost in ghosts]
+        state.data.ghostDistances = list(distances)
+        start = time.perf_counter()
+        if step == 0:
+            for module in modules: module.initialize(state)
+        else:
+            for module in modules: module.elapseTime(state)
+        for module in modules:
+            module.observe(state)
+        beliefs = [module.getBeliefDistribution() for module in modules]
+        elapsed += time.perf_counter() - start
+        for belief, ghostPosition in zip(beliefs, ghostPositions):
+            totalBelief += belief[ghostPosition]
+    return len(episode['steps']), totalBelief, elapsed
+
+def trackEpisodeTask(task):
+    spec, episodeIndex, episode, modelGhostType = task
+    return (spec, episodeIndex) + trackEpisode(episode, spec, episodeIndex, modelGhostType)
+
+def recordEpisodeTask(task):
+    return recordEpisode(*task)
+
+def summarize(results, episodes):
+    """
+    Aggregate trackEpisodeTask results into one row per module spec: (spec,
+    episodes, steps, mean belief on the true cell over all ghosts and steps,
+    milliseconds per step).
+    """
+    totals = {}
+    for spec, episodeIndex, steps, belief, seconds in results:
+        numGhosts = episodes[episodeIndex]['numGhosts']
+        count, numSteps, ghostSteps, beliefSum, secondsSum = totals.get(spec, (0, 0, 0, 0.0, 0.0))
+        totals[spec] = (count + 1, numSteps + steps, ghostSteps + steps * numGhosts,
+                        beliefSum + belief, secondsSum + seconds)
+    rows = []
+    for spec, (count, numSteps, ghostSteps, beliefSum, secondsSum) in totals.items():
+        rows.append((spec, count, numSteps, beliefSum / max(ghostSteps, 1),
+                     1000.0 * secondsSum / max(numSteps, 1)))
+    return rows
+
+def runBatch(episodes, specs, numWorkers=None, out=sys.stdout, modelGhostType=None):
+    """
+    Track every episode with every module spec in a process pool and write a
+    summary row per spec to out.  Returns the rows of summarize.
+    """
+    checkModules(specs, [modelGhostType or episode['ghostType'] for episode in episodes])
+    tasks = [(spec, i, episode, modelGhostType)
+             for spec in specs for i, episode in enumerate(episodes)]
+    layoutNames = list(set([episode['layout'] for episode in episodes]))
+    if numWorkers == 1:
+        results = [trackEpisodeTask(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(numWorkers, layout.prewarmLayouts, (layoutNames,))
+        try:
+            results = list(pool.imap_unordered(trackEpisodeTask, tasks,
+                                               chunksize=max(1, len(tasks) // (8 * (numWorkers or 4)))))
+        finally:
+            pool.close()
+            pool.join()
+    rows = summarize(results, episodes)
+    out.write('module,episodes,steps,meanTrueBelief,msPerStep\n')
+    for row in rows:
+        out.write('%s,%d,%d,%.4f,%.3f\n' % row)
+    return rows
+
+def recordEpisodes(layoutName, numGhosts, numMoves, numEpisodes, ghostType='RandomGhost',
+                   firstSeed=0, numWorkers=None):
+    tasks = [(layoutName, numGhosts, numMoves, seed, ghostType)
+             for seed in range(firstSeed, firstSeed + numEpisodes)]
+    if numWorkers == 1:
+        return [recordEpisodeTask(task) for task in tasks]
+    pool = multiprocessing.Pool(numWorkers, layout.prewarmLayouts, ([layoutName],))
+    try:
+        return pool.map(recordEpisodeTask, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python trackingBatch.py <options>
+    EXAMPLE:    python trackingBatch.py -l bigHunt -k 4 -n 200 --modules ExactInference
+                  - records 200 episodes on bigHunt and scores exact inference on them
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-l', '--layout', dest='layout', default='smallHunt',
+                      help='layout to record episodes on [Default: %default]')
+    parser.add_option('-k', '--numghosts', type='int', dest='numGhosts', default=2,
+                      help='number of ghosts [Default: %default]')
+    parser.add_option('-g', '--ghosts', dest='ghostType', default='RandomGhost',
+                      help='ghost agent type in ghostAgents.py or bustersGhostAgents.py '
+                           '[Default: %default]')
+    parser.add_option('--model', dest='modelGhostType', default=None,
+                      help='ghost type the modules assume; the recorded one if omitted')
+    parser.add_option('-n', '--numEpisodes', type='int', dest='numEpisodes', default=100,
+                      help='number of episodes to record [Default: %default]')
+    parser.add_option('-m', '--moves', type='int', dest='numMoves', default=50,
+                      help='maximum Pacman moves per episode [Default: %default]')
+    parser.add_option('-s', '--seed', type='int', dest='seed', default=0,
+                      help='seed of the first episode [Default: %default]')
+    parser.add_option('--modules', dest='modules',
+                      default='ExactInference,ParticleFilter,MarginalInference',
+                      help='comma separated inference module specs [Default: %default]')
+    parser.add_option('-j', '--workers', type='int', dest='numWorkers', default=None,
+                      help='number of worker processes; all cores if omitted')
+    parser.add_option('-i', '--input', dest='input', default=None,
+                      help='pickled episodes to replay instead of recording new ones')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='file to pickle the recorded episodes to')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    if options.input == None:
+        # Fail before recording rather than in the worker pool
+        checkModules(options.modules.split(','), [options.modelGhostType or options.ghostType])
+    if options.input != None:
+        f = open(options.input, 'rb')
+        try: episodes = pickle.load(f)
+        finally: f.close()
+    else:
+        episodes = recordEpisodes(options.layout, options.numGhosts, options.numMoves,
+                                  options.numEpisodes, options.ghostType, options.seed,
+                                  options.numWorkers)
+    if options.output != None:
+        f = open(options.output, 'wb')
+        try: pickle.dump(episodes, f)
+        finally: f.close()
+    runBatch(episodes, options.modules.split(','), options.numWorkers,
+             modelGhostType=options.modelGhostType)
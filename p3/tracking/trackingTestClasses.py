@@ -528,6 +528,8 @@ class GoSouthAgent(Agent):
 
 class DispersingSeededGhost( Agent):
     "Chooses an action that distances the ghost from the other ghosts with probability spreadProb."
+    isStationary = False  # Its moves depend on the other ghosts' cells
+
     def __init__( self, index, spreadProb=0.5):
         self.index = index
         self.spreadProb = spreadProb
@@ -489,14 +489,15 @@ def nSample(distribution, values, n):
             cdf += distribution[distPos]
     return samples
 
-def sample(distribution, values = None):
+def sample(distribution, values = None, randomStream = None):
+    if randomStream == None: randomStream = random
     if type(distribution) == Counter:
         items = sorted(distribution.items())
         distribution = [i[1] for i in items]
         values = [i[0] for i in items]
     if sum(distribution) != 1:
         distribution = normalize(distribution)
-    choice = random.random()
+    choice = randomStream.random()
     i, total= 0, distribution[0]
     while choice > total:
         i += 1
@@ -522,11 +523,12 @@ def flipCoin( p ):
     r = random.random()
     return r < p
 
-def chooseFromDistribution( distribution ):
+def chooseFromDistribution( distribution, randomStream = None ):
     "Takes either a counter or a list of (prob, key) pairs and samples"
+    if randomStream == None: randomStream = random
     if type(distribution) == dict or type(distribution) == Counter:
-        return sample(distribution)
-    r = random.random()
+        return sample(distribution, randomStream = randomStream)
+    r = randomStream.random()
     base = 0.0
     for prob, element in distribution:
         base += prob
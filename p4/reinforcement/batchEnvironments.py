@@ -0,0 +1,298 @@
+# batchEnvironments.py
+# --------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Many copies of a gridworld or of the crawler, stepped together.
+
+A BatchEnvironment numbers the states and actions of its environment and
+tabulates its dynamics once.  step then takes an array with one action
+number per copy and returns arrays of next states, rewards and episode ends,
+and copies whose episode ended start over on their own.  Nothing is
+displayed.  trainQLearning runs epsilon-greedy Q-learning over all the copies
+with array updates, and toQTable turns the result into a qTable.ArrayQTable
+that a QLearningAgent can use.
+
+python batchEnvironments.py -g MazeGrid -b 256 -k 4000
+python batchEnvironments.py --crawler -b 64 -k 2000
+"""
+
+import sys
+import time
+
+import numpy as np
+
+
+class BatchEnvironment:
+    """
+    numEnvs independent copies of an environment with numbered states and
+    actions.  Subclasses tabulate the environment and call setTables.
+
+    Episodes end on entering a terminal state or, if maxSteps is given,
+    after maxSteps steps; the copy is then put back in the start state.
+    """
+
+    def __init__(self, numEnvs, maxSteps=None, seed=None):
+        self.numEnvs = numEnvs
+        self.maxSteps = maxSteps
+        self.rng = np.random.default_rng(seed)
+
+    def setTables(self, states, actions, legal, transitions, startState):
+        """
+        states and actions list the state and action objects by number and
+        legal is the (numStates, numActions) mask of legal actions.
+        transitions[(s, a)] lists the (nextState, prob, reward) outcomes of
+        taking action a in state s, by number, for every legal pair.
+        States without legal actions are terminal.
+        """
+        self.states = states
+        self.actions = actions
+        self.numStates, self.numActions = len(states), len(actions)
+        self.legal = legal
+        self.terminal = ~legal.any(axis=1)
+        width = max([len(outcomes) for outcomes in transitions.values()] + [1])
+        numPairs = self.numStates * self.numActions
+        self.nextStates = np.zeros((numPairs, width), dtype=np.intp)
+        self.cumProbs = np.full((numPairs, width), np.inf)
+        self.rewards = np.zeros((numPairs, width))
+        self.numOutcomes = np.ones(numPairs, dtype=np.intp)
+        for (s, a), outcomes in transitions.items():
+            pair = s * self.numActions + a
+            total = 0.0
+            for k, (nextState, prob, reward) in enumerate(outcomes):
+                total += prob
+                self.nextStates[pair, k] = nextState
+                self.cumProbs[pair, k] = total
+                self.rewards[pair, k] = reward
+            self.numOutcomes[pair] = len(outcomes)
+        self.startState = startState
+        # Legal action numbers of every state, padded with the first one
+        self.numLegal = legal.sum(axis=1)
+        self.legalActions = np.zeros((self.numStates, self.numActions), dtype=np.intp)
+        for s in range(self.numStates):
+            columns = np.flatnonzero(legal[s])
+            self.legalActions[s, :len(columns)] = columns
+        self.reset()
+
+    def reset(self):
+        """
+        Put every copy in the start state and return the array of states.
+        """
+        self.currentStates = np.full(self.numEnvs, self.startState, dtype=np.intp)
+        self.episodeSteps = np.zeros(self.numEnvs, dtype=np.intp)
+        return self.currentStates
+
+    def getCurrentStates(self):
+        return self.currentStates
+
+    def getPossibleActions(self, state):
+        """
+        The legal action objects of a state object.
+        """
+        s = self.states.index(state)
+        return [self.actions[a] for a in np.flatnonzero(self.legal[s])]
+
+    def getRandomActions(self):
+        """
+        A uniformly random legal action number for every copy.
+        """
+        states = self.currentStates
+        picks = (self.rng.random(self.numEnvs) * np.maximum(self.numLegal[states], 1)).astype(np.intp)
+        return self.legalActions[states, picks]
+
+    def step(self, actions):
+        """
+        Take one action number per copy.  Returns (nextStates, rewards,
+        dones): dones marks the copies whose episode ended, which are back
+        in the start state in getCurrentStates().  nextStates holds the
+        states they reached, so learners can tell a terminal state
+        (self.terminal) from an episode cut short by maxSteps.
+        """
+        states = self.currentStates
+        actions = np.asarray(actions, dtype=np.intp)
+        if not self.legal[states, actions].all():
+            raise Exception('Illegal action!')
+        pairs = states * self.numActions + actions
+        draws = self.rng.random(self.numEnvs)
+        outcomes = (self.cumProbs[pairs] <= draws[:, None]).sum(axis=1)
+        outcomes = np.minimum(outcomes, self.numOutcomes[pairs] - 1)
+        nextStates = self.nextStates[pairs, outcomes]
+        rewards = self.rewards[pairs, outcomes]
+        self.episodeSteps += 1
+        dones = self.terminal[nextStates]
+        if self.maxSteps is not None:
+            dones = dones | (self.episodeSteps >= self.maxSteps)
+        self.currentStates = np.where(dones, self.startState, nextStates)
+        self.episodeSteps[dones] = 0
+        return nextStates, rewards, dones
+
+
+class GridworldBatchEnvironment(BatchEnvironment):
+    """
+    Copies of a gridworld.Gridworld, tabulated from its compiledMdp.CompiledMDP.
+    """
+
+    def __init__(self, gridWorld, numEnvs, maxSteps=None, seed=None):
+        import compiledMdp
+        BatchEnvironment.__init__(self, numEnvs, maxSteps, seed)
+        self.gridWorld = gridWorld
+        compiled = compiledMdp.compileMdp(gridWorld)
+        transitions = {}
+        for pair, nextState, prob, reward in zip(compiled.pairs.tolist(), compiled.nextStates.tolist(),
+                                                 compiled.probs.tolist(), compiled.rewards.tolist()):
+            transitions.setdefault(divmod(pair, compiled.numActions), []).append((nextState, prob, reward))
+        self.setTables(compiled.states, compiled.actions, compiled.legal, transitions,
+                       compiled.stateIndex[gridWorld.getStartState()])
+
+    def getPossibleActions(self, state):
+        return self.gridWorld.getPossibleActions(state)
+
+
+class CrawlerBatchEnvironment(BatchEnvironment):
+    """
+    Copies of the crawler.CrawlingRobotEnvironment.  Its moves are
+    deterministic and its rewards depend only on the arm and hand buckets,
+    so one headless robot tabulates them all.  The crawler never stops by
+    itself; give maxSteps for episodes.
+    """
+
+    def __init__(self, numEnvs, maxSteps=None, seed=None):
+        import crawler
+        BatchEnvironment.__init__(self, numEnvs, maxSteps, seed)
+        environment = crawler.CrawlingRobotEnvironment(crawler.CrawlingRobot())
+        self.crawlerEnvironment = environment
+        states = [(arm, hand) for arm in range(environment.nArmStates)
+                  for hand in range(environment.nHandStates)]
+        actions = ['arm-down', 'arm-up', 'hand-down', 'hand-up']
+        stateIndex = dict([(state, i) for i, state in enumerate(states)])
+        legal = np.zeros((len(states), len(actions)), dtype=bool)
+        transitions = {}
+        for s, state in enumerate(states):
+            for action in environment.getPossibleActions(state):
+                arm, hand = state
+                environment.state = state
+                environment.crawlingRobot.setAngles(environment.armBuckets[arm],
+                                                    environment.handBuckets[hand])
+                nextState, reward = environment.doAction(action)
+                a = actions.index(action)
+                legal[s, a] = True
+                transitions[(s, a)] = [(stateIndex[nextState], 1.0, reward)]
+        environment.reset()
+        self.setTables(states, actions, legal, transitions,
+                       stateIndex[environment.getCurrentState()])
+
+    def getPossibleActions(self, state):
+        return self.crawlerEnvironment.getPossibleActions(state)
+
+
+def trainQLearning(env, numSteps, alpha=0.5, discount=0.9, epsilon=0.3, qValues=None):
+    """
+    Run numSteps epsilon-greedy steps of every copy in env, updating the
+    (numStates, numActions) array qValues (zeros by default) after each.
+    Copies that update the same Q-value in one step share it by averaging
+    their updates.  Returns qValues.
+    """
+    if qValues is None:
+        qValues = np.zeros((env.numStates, env.numActions))
+    penalty = np.where(env.legal, 0.0, -np.inf)
+    for step in range(numSteps):
+        states = env.getCurrentStates()
+        greedy = (qValues[states] + penalty[states]).argmax(axis=1)
+        explore = env.rng.random(env.numEnvs) < epsilon
+        actions = np.where(explore, env.getRandomActions(), greedy)
+        nextStates, rewards, dones = env.step(actions)
+        nextValues = np.where(env.terminal[nextStates], 0.0,
+                              (qValues[nextStates] + penalty[nextStates]).max(axis=1))
+        pairs = states * env.numActions + actions
+        deltas = alpha * (rewards + discount * nextValues - qValues.flat[pairs])
+        uniquePairs, inverse, counts = np.unique(pairs, return_inverse=True, return_counts=True)
+        sums = np.bincount(inverse, weights=deltas, minlength=len(uniquePairs))
+        qValues.flat[uniquePairs] += sums / counts
+    return qValues
+
+
+def toQTable(env, qValues):
+    """
+    A qTable.ArrayQTable holding qValues for every state of env, with the
+    legal actions in the order the environment lists them.
+    """
+    from qTable import ArrayQTable
+    table = ArrayQTable(max(env.numStates, 1))
+    actionIndex = dict([(action, a) for a, action in enumerate(env.actions)])
+    for s, state in enumerate(env.states):
+        legalActions = env.getPossibleActions(state)
+        table.getRow(state, lambda state: legalActions)
+        for action in legalActions:
+            table.setQValue(state, action, qValues[s, actionIndex[action]], None)
+    return table
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python batchEnvironments.py <options>
+    EXAMPLE:    python batchEnvironments.py -g BookGrid -b 128 -k 2000
+                  - trains Q-learning on 128 copies of BookGrid for 2000 steps each
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-g', '--grid', dest='grid', default='BookGrid',
+                      help='gridworld to train on, as for gridworld.py [Default: %default]')
+    parser.add_option('--crawler', action='store_true', dest='crawler', default=False,
+                      help='train the crawler instead of a gridworld')
+    parser.add_option('-b', '--batch', type='int', dest='numEnvs', default=64,
+                      help='number of environment copies [Default: %default]')
+    parser.add_option('-k', '--steps', type='int', dest='numSteps', default=1000,
+                      help='steps of every copy [Default: %default]')
+    parser.add_option('-m', '--maxSteps', type='int', dest='maxSteps', default=None,
+                      help='steps before an episode is cut short')
+    parser.add_option('-n', '--noise', type='float', dest='noise', default=0.2,
+                      help='how often gridworld actions go astray [Default: %default]')
+    parser.add_option('-r', '--livingReward', type='float', dest='livingReward', default=0.0,
+                      help='reward for living for a time step [Default: %default]')
+    parser.add_option('-d', '--discount', type='float', dest='discount', default=0.9,
+                      help='discount on future rewards [Default: %default]')
+    parser.add_option('-l', '--learningRate', type='float', dest='alpha', default=0.5,
+                      help='TD learning rate [Default: %default]')
+    parser.add_option('-e', '--epsilon', type='float', dest='epsilon', default=0.3,
+                      help='chance of taking a random action [Default: %default]')
+    parser.add_option('-s', '--seed', type='int', dest='seed', default=None,
+                      help='random seed')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    if options.crawler:
+        env = CrawlerBatchEnvironment(options.numEnvs, options.maxSteps, options.seed)
+    else:
+        import gridworld
+        grid = getattr(gridworld, 'get' + options.grid)()
+        grid.setNoise(options.noise)
+        grid.setLivingReward(options.livingReward)
+        env = GridworldBatchEnvironment(grid, options.numEnvs, options.maxSteps, options.seed)
+    start = time.perf_counter()
+    qValues = trainQLearning(env, options.numSteps, options.alpha, options.discount, options.epsilon)
+    seconds = time.perf_counter() - start
+    transitions = options.numSteps * options.numEnvs
+    print('%d transitions in %.2f seconds (%.1f million per minute)'
+          % (transitions, seconds, transitions * 60.0 / seconds / 1e6))
+    values = np.where(env.terminal, 0.0, np.where(env.legal, qValues, -np.inf).max(axis=1))
+    print('Learned value of the start state: %.4f' % values[env.startState])
+    if not options.crawler:
+        import compiledMdp
+        exact = compiledMdp.CompiledValueIterationAgent(grid, options.discount, -1, 1e-9)
+        print('Largest difference from value iteration: %.4f'
+              % max([abs(values[s] - exact.getValue(state)) for s, state in enumerate(env.states)]))
@@ -0,0 +1,460 @@
+# compiledMdp.py
+# --------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Markov decision processes compiled into integer-indexed NumPy arrays.
+
+CompiledMDP walks an mdp.MarkovDecisionProcess once and numbers its states
+and actions.  The transition tensor P[s,a,s'] and reward tensor R[s,a,s']
+are stored sparsely, one entry per reachable (s, a, s') triple, so a
+Bellman backup of every state is a single weighted np.bincount over the
+entries.  CompiledValueIterationAgent uses it to run value iteration until
+the largest change in a sweep drops to a tolerance, and answers getValue,
+getPolicy and getQValue like ValueIterationAgent:
+
+python gridworld.py -a compiledvalue -i 1000 --tolerance 1e-6
+
+valueIterationAgents.PolicyIterationAgent runs modified policy iteration, or
+exact policy iteration, on the same arrays with runPolicyIteration.  Run as a
+script, this module times the solvers against each other and against
+ValueIterationAgent on a gridworld:
+
+python compiledMdp.py -g LargeGrid -d 0.99 --solvers compiledvalue,policy,exactpolicy
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import mdp
+import util
+from learningAgents import ValueEstimationAgent
+
+
+class CompiledMDP:
+    """
+    The arrays of an MDP.  States are numbered in the order of
+    mdp.getStates() and actions in the order they are first met; for each
+    state the legal actions are marked in the (numStates, numActions)
+    boolean array legal.
+
+    The transitions are listed entry by entry: entry i leads from the
+    state-action pair pairs[i] (numbered s * numActions + a) to the state
+    nextStates[i] with probability probs[i] and reward rewards[i].
+    expectedRewards[s, a] is the reward expected from taking a in s.
+    """
+
+    def __init__(self, mdp):
+        self.states = list(mdp.getStates())
+        self.stateIndex = dict([(state, i) for i, state in enumerate(self.states)])
+        self.actions = []
+        self.actionIndex = {}
+        pairs, nextStates, probs, rewards, legalPairs = [], [], [], [], []
+        for s, state in enumerate(self.states):
+            for action in mdp.getPossibleActions(state):
+                if action not in self.actionIndex:
+                    self.actionIndex[action] = len(self.actions)
+                    self.actions.append(action)
+                pair = (s, self.actionIndex[action])
+                legalPairs.append(pair)
+                for nextState, prob in mdp.getTransitionStatesAndProbs(state, action):
+                    if prob == 0: continue
+                    if nextState not in self.stateIndex:
+                        raise Exception('Transition to a state not in getStates(): ' + str(nextState))
+                    pairs.append(pair)
+                    nextStates.append(self.stateIndex[nextState])
+                    probs.append(prob)
+                    rewards.append(mdp.getReward(state, action, nextState))
+
+        self.numStates = len(self.states)
+        self.numActions = max(len(self.actions), 1)
+        self.legal = np.zeros((self.numStates, self.numActions), dtype=bool)
+        for s, a in legalPairs:
+            self.legal[s, a] = True
+        self.hasActions = self.legal.any(axis=1)
+        self.pairs = np.array([s * self.numActions + a for s, a in pairs], dtype=np.intp)
+        self.nextStates = np.array(nextStates, dtype=np.intp)
+        self.probs = np.array(probs, dtype=float)
+        self.rewards = np.array(rewards, dtype=float)
+        self.expectedRewards = self.sumOverEntries(self.probs * self.rewards)
+        self.successorLists = None
+        self.predecessors = None
+
+    def sumOverEntries(self, entryValues):
+        """
+        Sum one value per transition entry into a (numStates, numActions)
+        array over the entries' state-action pairs.
+        """
+        sums = np.bincount(self.pairs, weights=entryValues,
+                           minlength=self.numStates * self.numActions)
+        return sums.reshape(self.numStates, self.numActions)
+
+    def getQValues(self, values, discount):
+        """
+        Return the (numStates, numActions) array of Q-values under the state
+        values, with -inf for illegal actions.
+        """
+        qValues = self.expectedRewards + discount * self.sumOverEntries(
+            self.probs * values[self.nextStates])
+        qValues[~self.legal] = -np.inf
+        return qValues
+
+    def getValues(self, qValues):
+        """
+        The best Q-value of every state, 0 for states without actions.
+        """
+        return np.where(self.hasActions, qValues.max(axis=1), 0.0)
+
+    def getPolicy(self, qValues):
+        """
+        The index of the best action of every state, -1 for states without
+        actions.  Ties go to the action met first while compiling.
+        """
+        return np.where(self.hasActions, qValues.argmax(axis=1), -1)
+
+    def getSuccessorLists(self):
+        """
+        For every state, a list with one (expectedReward, [(nextState, prob),
+        ...]) per action, in plain Python for backing up one state at a time.
+        Built on the first call.
+        """
+        if self.successorLists is None:
+            lists = [[] for s in range(self.numStates)]
+            currentPair = None
+            for pair, nextState, prob in zip(self.pairs.tolist(), self.nextStates.tolist(),
+                                             self.probs.tolist()):
+                if pair != currentPair:
+                    currentPair = pair
+                    s, a = divmod(pair, self.numActions)
+                    successors = []
+                    lists[s].append((float(self.expectedRewards[s, a]), successors))
+                successors.append((nextState, prob))
+            self.successorLists = lists
+        return self.successorLists
+
+    def getPredecessors(self):
+        """
+        For every state, the sorted list of the states that can reach it in
+        one transition.  Built on the first call.
+        """
+        if self.predecessors is None:
+            predecessors = [set() for s in range(self.numStates)]
+            for pair, nextState in zip(self.pairs.tolist(), self.nextStates.tolist()):
+                predecessors[nextState].add(pair // self.numActions)
+            self.predecessors = [sorted(p) for p in predecessors]
+        return self.predecessors
+
+    def getPolicyModel(self, policy):
+        """
+        The Markov chain of following policy (an action index per state):
+        (rewards, matvec), where rewards[s] is the reward expected from s and
+        matvec(v) returns P_policy v.
+        """
+        states = np.arange(self.numStates)
+        chosen = np.where(policy >= 0, states * self.numActions + policy, -1)
+        follows = chosen[self.pairs // self.numActions] == self.pairs
+        rows = self.pairs[follows] // self.numActions
+        nextStates = self.nextStates[follows]
+        probs = self.probs[follows]
+        rewards = np.where(policy >= 0, self.expectedRewards[states, np.maximum(policy, 0)], 0.0)
+
+        def matvec(v):
+            return np.bincount(rows, weights=probs * v[nextStates], minlength=self.numStates)
+        return rewards, matvec
+
+    def toCounter(self, values):
+        """
+        A util.Counter from states to the values listed by state number.
+        """
+        counter = util.Counter()
+        for state, value in zip(self.states, values):
+            counter[state] = float(value)
+        return counter
+
+
+def compileMdp(mdp):
+    """
+    Return the CompiledMDP of mdp, built once and kept on it until its
+    parameters change (see Gridworld.setNoise and setLivingReward).
+    """
+    compiled = getattr(mdp, 'compiled', None)
+    if compiled is None:
+        compiled = CompiledMDP(mdp)
+        mdp.compiled = compiled
+    return compiled
+
+
+def runValueIteration(compiled, discount, iterations=100, tolerance=0.0, values=None):
+    """
+    Synchronous value iteration over a CompiledMDP, starting from values (all
+    zeros by default).  Stops after iterations sweeps (no limit if None or
+    negative) or once no value changes by more than tolerance in a sweep.
+    Returns the values and the number of sweeps run.
+    """
+    if values is None:
+        values = np.zeros(compiled.numStates)
+    sweeps = 0
+    while iterations is None or iterations < 0 or sweeps < iterations:
+        newValues = compiled.getValues(compiled.getQValues(values, discount))
+        sweeps += 1
+        change = np.abs(newValues - values).max() if compiled.numStates else 0.0
+        values = newValues
+        if change <= tolerance:
+            break
+    return values, sweeps
+
+
+def solveLinear(matvec, b, x, tolerance=1e-10, maxIterations=1000):
+    """
+    Solve A x = b by BiCGSTAB, given matvec(v) = A v and a first guess x.
+    Stops once the residual is within tolerance of |b| (max norms).  Returns
+    the solution and the number of products with A, or None for the
+    solution if the method broke down.
+    """
+    r = b - matvec(x)
+    products = 1
+    scale = max(np.abs(b).max(), 1e-300) if len(b) else 1.0
+    rHat = r.copy()
+    rho = alpha = omega = 1.0
+    v = p = np.zeros_like(b)
+    for iteration in range(maxIterations):
+        if np.abs(r).max() <= tolerance * scale:
+            return x, products
+        rhoNext = rHat.dot(r)
+        if rhoNext == 0 or omega == 0:
+            return None, products
+        beta = (rhoNext / rho) * (alpha / omega)
+        rho = rhoNext
+        p = r + beta * (p - omega * v)
+        v = matvec(p)
+        alpha = rho / rHat.dot(v)
+        s = r - alpha * v
+        t = matvec(s)
+        products += 2
+        tt = t.dot(t)
+        omega = t.dot(s) / tt if tt else 0.0
+        x = x + alpha * p + omega * s
+        r = s - omega * t
+    return (x if np.abs(r).max() <= tolerance * scale else None), products
+
+
+def evaluatePolicy(compiled, policy, discount, values=None, steps=None, tolerance=1e-10):
+    """
+    The values of following policy in a CompiledMDP and the number of
+    products with the policy's transition matrix it took.  With steps
+    None, V = R + discount P V is solved (by BiCGSTAB, falling back on
+    iterating it to tolerance); otherwise values is backed up that many
+    times under the policy (modified policy iteration).
+    """
+    rewards, matvec = compiled.getPolicyModel(policy)
+    if values is None:
+        values = np.zeros(compiled.numStates)
+    if steps is None:
+        solution, products = solveLinear(lambda v: v - discount * matvec(v), rewards, values,
+                                         tolerance)
+        if solution is not None:
+            return solution, products
+        steps = -1
+    else:
+        products = 0
+    while steps < 0 or products < steps:
+        newValues = rewards + discount * matvec(values)
+        products += 1
+        change = np.abs(newValues - values).max() if len(values) else 0.0
+        values = newValues
+        if steps < 0 and change <= tolerance * (1 - discount):
+            break
+    return values, products
+
+
+
+def runPolicyIteration(compiled, discount, iterations=100, evaluationSteps=None, tolerance=1e-10):
+    """
+    Policy iteration over a CompiledMDP, starting from the first legal action
+    in every state, for at most iterations rounds (no limit if None or
+    negative).  Each round evaluates the policy with evaluatePolicy (exactly
+    if evaluationSteps is None) and makes it greedy.  Exact policy iteration
+    stops once the policy no longer changes; modified policy iteration once
+    a greedy backup changes no value by more than tolerance.  Returns the
+    values, the rounds run and the products with policy transition matrices.
+    """
+    policy = np.where(compiled.hasActions, compiled.legal.argmax(axis=1), -1)
+    values = np.zeros(compiled.numStates)
+    rounds = products = 0
+    while iterations is None or iterations < 0 or rounds < iterations:
+        values, steps = evaluatePolicy(compiled, policy, discount, values,
+                                       evaluationSteps, tolerance)
+        rounds += 1
+        products += steps
+        qValues = compiled.getQValues(values, discount)
+        greedy = compiled.getPolicy(qValues)
+        states = np.arange(compiled.numStates)
+        # Keep the current action where it is as good as the greedy one
+        current = qValues[states, np.maximum(policy, 0)]
+        best = qValues[states, np.maximum(greedy, 0)]
+        slack = 1e-12 * np.maximum(np.abs(best), 1.0)
+        greedy = np.where(current >= best - slack, policy, greedy)
+        if evaluationSteps is None:
+            if (greedy == policy).all():
+                break
+        else:
+            greedyValues = compiled.getValues(qValues)
+            if compiled.numStates == 0 or np.abs(greedyValues - values).max() <= tolerance:
+                values = greedyValues
+                break
+        policy = greedy
+    return values, rounds, products
+
+
+class CompiledValueIterationAgent(ValueEstimationAgent):
+    """
+        A value iteration agent on the CompiledMDP of its mdp.  It runs at
+        most iterations sweeps, stopping early once no value changes by more
+        than tolerance; self.sweeps holds the number of sweeps it ran.  With
+        tolerance 0 its values match ValueIterationAgent's.
+    """
+
+    def __init__(self, mdp: mdp.MarkovDecisionProcess, discount=0.9, iterations=100, tolerance=0.0):
+        self.mdp = mdp
+        self.discount = discount
+        self.iterations = iterations
+        self.tolerance = tolerance
+        self.compiled = compileMdp(mdp)
+        self.runValueIteration()
+
+    def runValueIteration(self):
+        self.valueArray, self.sweeps = runValueIteration(
+            self.compiled, self.discount, self.iterations, self.tolerance)
+        self.setValues(self.valueArray)
+
+    def setValues(self, values):
+        """
+        Store the state values and derive the Q-values and policy from them.
+        """
+        self.valueArray = values
+        self.qValueArray = self.compiled.getQValues(values, self.discount)
+        self.policyArray = self.compiled.getPolicy(self.qValueArray)
+
+    def getValue(self, state):
+        s = self.compiled.stateIndex.get(state)
+        if s is None:
+            return 0.0
+        return float(self.valueArray[s])
+
+    def getQValue(self, state, action):
+        s = self.compiled.stateIndex.get(state)
+        a = self.compiled.actionIndex.get(action)
+        if s is None or a is None or not self.compiled.legal[s, a]:
+            return 0.0
+        return float(self.qValueArray[s, a])
+
+    def getPolicy(self, state):
+        s = self.compiled.stateIndex.get(state)
+        if s is None or self.policyArray[s] < 0:
+            return None
+        return self.compiled.actions[self.policyArray[s]]
+
+    def getAction(self, state):
+        "Returns the policy at the state (no exploration)."
+        return self.getPolicy(state)
+
+    def computeQValueFromValues(self, state, action):
+        return self.getQValue(state, action)
+
+    def computeActionFromValues(self, state):
+        return self.getPolicy(state)
+
+
+SOLVERS = ['value', 'compiledvalue', 'policy', 'exactpolicy']
+
+
+def compareSolvers(mdp, discount=0.9, tolerance=1e-6, evaluationSteps=20, solvers=SOLVERS,
+                   out=sys.stdout):
+    """
+    Solve mdp with each solver in solvers and write a CSV row per solver to
+    out: its iterations (sweeps or policy rounds), wall time in seconds and
+    the largest difference from the values of compiledvalue.  'value' is
+    valueIterationAgents.ValueIterationAgent, given as many iterations as
+    compiledvalue needed to converge, and 'policy' and 'exactpolicy' are
+    valueIterationAgents.PolicyIterationAgent, modified and exact.  Returns
+    the rows as tuples.
+    """
+    import valueIterationAgents
+    start = time.perf_counter()
+    reference = CompiledValueIterationAgent(mdp, discount, -1, tolerance)
+    referenceSeconds = time.perf_counter() - start
+    states = mdp.getStates()
+    rows = []
+    out.write('solver,iterations,seconds,maxValueError\n')
+    for solver in solvers:
+        start = time.perf_counter()
+        if solver == 'value':
+            agent = valueIterationAgents.ValueIterationAgent(mdp, discount, reference.sweeps)
+            iterations = reference.sweeps
+        elif solver == 'compiledvalue':
+            agent, iterations = reference, reference.sweeps
+        elif solver == 'policy':
+            agent = valueIterationAgents.PolicyIterationAgent(mdp, discount, -1, evaluationSteps, tolerance)
+            iterations = agent.policyIterations
+        elif solver == 'exactpolicy':
+            agent = valueIterationAgents.PolicyIterationAgent(mdp, discount, -1, None)
+            iterations = agent.policyIterations
+        else:
+            raise Exception('Unknown solver: ' + solver)
+        seconds = referenceSeconds if solver == 'compiledvalue' else time.perf_counter() - start
+        error = max([abs(agent.getValue(state) - reference.getValue(state)) for state in states])
+        row = (solver, iterations, seconds, error)
+        rows.append(row)
+        out.write('%s,%d,%.4f,%.3g\n' % row)
+        out.flush()
+    return rows
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python compiledMdp.py <options>
+    EXAMPLE:    python compiledMdp.py -g LargeGrid -d 0.99 --solvers compiledvalue,policy
+                  - times vectorized value iteration against policy iteration
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-g', '--grid', dest='grid', default='BookGrid',
+                      help='gridworld to solve, as for gridworld.py [Default: %default]')
+    parser.add_option('-d', '--discount', type='float', dest='discount', default=0.9,
+                      help='discount on future rewards [Default: %default]')
+    parser.add_option('-r', '--livingReward', type='float', dest='livingReward', default=0.0,
+                      help='reward for living for a time step [Default: %default]')
+    parser.add_option('-n', '--noise', type='float', dest='noise', default=0.2,
+                      help='how often actions go in unintended directions [Default: %default]')
+    parser.add_option('--tolerance', type='float', dest='tolerance', default=1e-6,
+                      help='largest value change at convergence [Default: %default]')
+    parser.add_option('-k', '--evaluationSteps', type='int', dest='evaluationSteps', default=20,
+                      help='backups per evaluation in modified policy iteration [Default: %default]')
+    parser.add_option('--solvers', dest='solvers', default=','.join(SOLVERS),
+                      help='comma separated solvers to compare [Default: %default]')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    import gridworld
+    options = readCommand(sys.argv[1:])
+    grid = getattr(gridworld, 'get' + options.grid)()
+    grid.setLivingReward(options.livingReward)
+    grid.setNoise(options.noise)
+    compareSolvers(grid, options.discount, options.tolerance, options.evaluationSteps,
+                   options.solvers.split(','))
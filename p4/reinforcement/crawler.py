@@ -331,7 +331,11 @@ class CrawlingRobot:
         self.lastStep = stepCount
 #        self.lastVel = velocity
 
-    def __init__(self, canvas):
+    def __init__(self, canvas=None):
+        """
+        Without a canvas the robot is headless: it moves and measures its
+        displacement but cannot be drawn.
+        """
 
         ## Canvas ##
         self.canvas = canvas
@@ -352,27 +356,31 @@ class CrawlingRobot:
         self.minHandAngle = -(5.0/6.0) * PI
 
         ## Draw Ground ##
-        self.totWidth = canvas.winfo_reqwidth()
-        self.totHeight = canvas.winfo_reqheight()
+        if canvas is None:
+            self.totWidth, self.totHeight = 1000, 200
+        else:
+            self.totWidth = canvas.winfo_reqwidth()
+            self.totHeight = canvas.winfo_reqheight()
         self.groundHeight = 40
         self.groundY = self.totHeight - self.groundHeight
 
-        self.ground = canvas.create_rectangle(0,
-            self.groundY,self.totWidth,self.totHeight, fill='blue')
-
         ## Robot Body ##
         self.robotWidth = 80
         self.robotHeight = 40
         self.robotPos = (20, self.groundY)
-        self.robotBody = canvas.create_polygon(0,0,0,0,0,0,0,0, fill='green')
 
         ## Robot Arm ##
         self.armLength = 60
-        self.robotArm = canvas.create_line(0,0,0,0,fill='orange',width=5)
 
         ## Robot Hand ##
         self.handLength = 40
-        self.robotHand = canvas.create_line(0,0,0,0,fill='red',width=3)
+
+        if canvas is not None:
+            self.ground = canvas.create_rectangle(0,
+                self.groundY,self.totWidth,self.totHeight, fill='blue')
+            self.robotBody = canvas.create_polygon(0,0,0,0,0,0,0,0, fill='green')
+            self.robotArm = canvas.create_line(0,0,0,0,fill='orange',width=5)
+            self.robotHand = canvas.create_line(0,0,0,0,fill='red',width=3)
 
         self.positions = [0,0]
   #      self.angleSums = [0,0]
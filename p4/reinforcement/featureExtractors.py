@@ -15,8 +15,79 @@
 "Feature extractors for Pacman game states"
 
 from game import Directions, Actions
+import collections
+import zlib
+
+import numpy as np
+
 import util
 
+class FeatureSpace:
+    """
+    Interns feature names to consecutive integer indices, so that feature
+    vectors can be (indices, values) arrays and weights a NumPy array.
+    """
+    def __init__(self):
+        self.index = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def getIndex(self, name):
+        i = self.index.get(name)
+        if i is None:
+            i = len(self.names)
+            self.index[name] = i
+            self.names.append(name)
+        return i
+
+    def getName(self, index):
+        return self.names[index]
+
+    def toArrays(self, features):
+        """
+          The (indices, values) arrays of a dict from features to values,
+          in the dict's order.
+        """
+        indices = np.fromiter((self.getIndex(name) for name in features), dtype=np.intp,
+                              count=len(features))
+        values = np.fromiter(features.values(), dtype=float, count=len(features))
+        return indices, values
+
+class HashedFeatureSpace(FeatureSpace):
+    """
+    The hashing trick: a feature's index is a CRC32 of its repr modulo
+    dimension, with no table to grow.  Different features may share an
+    index.  The hash does not depend on the process, so indices agree
+    across runs and worker processes.
+
+    Names are not kept, so getName returns the index itself, and getIndex
+    maps an int index back to itself; weights listed by getName therefore
+    load back into the same slots.
+    """
+    def __init__(self, dimension=2 ** 20):
+        FeatureSpace.__init__(self)
+        self.dimension = dimension
+
+    def __len__(self):
+        return self.dimension
+
+    def getIndex(self, name):
+        if isinstance(name, int) and 0 <= name < self.dimension:
+            return name
+        return zlib.crc32(repr(name).encode()) % self.dimension
+
+    def getName(self, index):
+        return int(index)
+
+def getFeatureSpace(dimension=0):
+    "A HashedFeatureSpace of the given dimension, or a FeatureSpace if it is 0"
+    dimension = int(dimension)
+    if dimension > 0:
+        return HashedFeatureSpace(dimension)
+    return FeatureSpace()
+
 class FeatureExtractor:
     def getFeatures(self, state, action):
         """
@@ -26,6 +97,74 @@ class FeatureExtractor:
         """
         util.raiseNotDefined()
 
+    def getSparseFeatures(self, state, action, featureSpace):
+        """
+          Returns the features as (indices, values) arrays over
+          featureSpace.
+        """
+        return featureSpace.toArrays(self.getFeatures(state, action))
+
+    def getStateFeatures(self, state, actions):
+        """
+          Returns a dict from each of actions to its features, in the
+          order of actions.  Extractors that share work between the
+          actions of a state override this.
+        """
+        return dict([(action, self.getFeatures(state, action)) for action in actions])
+
+    def getSparseStateFeatures(self, state, actions, featureSpace):
+        """
+          Like getStateFeatures, with the features as (indices, values)
+          arrays over featureSpace.
+        """
+        return dict([(action, featureSpace.toArrays(features))
+                     for action, features in self.getStateFeatures(state, actions).items()])
+
+class StateFeatureCache:
+    """
+    A least-recently-used cache of per-state feature computations.
+
+    Entries are keyed by the identity of the state: the game hands the agent
+    the same state object in update (as nextState) and in getAction, while
+    hashing a GameState walks its whole food grid.  Every entry keeps its
+    state alive, so an id cannot be reused while it is stored.  Once maxSize
+    states are stored, adding another evicts the one used longest ago.
+    """
+    def __init__(self, maxSize=64):
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, state):
+        """
+        Return the entry stored for state, or None.
+        """
+        key = id(state)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not state:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, state, value):
+        key = id(state)
+        self.entries[key] = (state, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Drop every stored entry.
+        """
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
 class IdentityExtractor(FeatureExtractor):
     def getFeatures(self, state, action):
         feats = util.Counter()
@@ -41,15 +180,25 @@ class CoordinateExtractor(FeatureExtractor):
         feats['action=%s' % action] = 1.0
         return feats
 
-def closestFood(pos, food, walls):
+def closestFood(pos, food, walls, pathfinder=None):
     """
     closestFood -- this is similar to the function that we have
     worked on in the search project; here its all in one place
+
+    Given the layout's pathfinder (Layout.getPathfinder), the distance is
+    read from a breadth-first distance field grown from all the food at once,
+    which is shared by every call with the same food and updated
+    incrementally as food is eaten.
     """
-    fringe = [(pos[0], pos[1], 0)]
+    if pathfinder is not None:
+        nearest = pathfinder.getNearestTarget(pos, food)
+        if nearest is None:
+            return None
+        return nearest[0]
+    fringe = collections.deque([(pos[0], pos[1], 0)])
     expanded = set()
     while fringe:
-        pos_x, pos_y, dist = fringe.pop(0)
+        pos_x, pos_y, dist = fringe.popleft()
         if (pos_x, pos_y) in expanded:
             continue
         expanded.add((pos_x, pos_y))
@@ -70,34 +219,91 @@ class SimpleExtractor(FeatureExtractor):
     - how far away the next food is
     - whether a ghost collision is imminent
     - whether a ghost is one step away
+
+    What every action of a state shares (the grids, Pacman's position and
+    how many ghosts neighbour each cell) is computed once per state, and
+    the features of its actions are kept with it in a StateFeatureCache of
+    cacheSize states.
     """
 
-    def getFeatures(self, state, action):
+    def __init__(self, cacheSize=64):
+        self.cache = StateFeatureCache(cacheSize)
+
+    def getStateInfo(self, state):
+        """
+          The parts of the features that do not depend on the action.
+        """
         # extract the grid of food and wall locations and get the ghost locations
         food = state.getFood()
         walls = state.getWalls()
-        ghosts = state.getGhostPositions()
+        ghostNeighbors = {}
+        for g in state.getGhostPositions():
+            for cell in Actions.getLegalNeighbors(g, walls):
+                ghostNeighbors[cell] = ghostNeighbors.get(cell, 0) + 1
+        return (food, walls, ghostNeighbors, state.getPacmanPosition(),
+                state.data.layout.getPathfinder())
 
+    def computeFeatures(self, info, action):
+        food, walls, ghostNeighbors, (x, y), pathfinder = info
         features = util.Counter()
 
         features["bias"] = 1.0
 
         # compute the location of pacman after he takes the action
-        x, y = state.getPacmanPosition()
         dx, dy = Actions.directionToVector(action)
         next_x, next_y = int(x + dx), int(y + dy)
 
         # count the number of ghosts 1-step away
-        features["#-of-ghosts-1-step-away"] = sum((next_x, next_y) in Actions.getLegalNeighbors(g, walls) for g in ghosts)
+        features["#-of-ghosts-1-step-away"] = ghostNeighbors.get((next_x, next_y), 0)
 
         # if there is no danger of ghosts then add the food feature
         if not features["#-of-ghosts-1-step-away"] and food[next_x][next_y]:
             features["eats-food"] = 1.0
 
-        dist = closestFood((next_x, next_y), food, walls)
+        dist = closestFood((next_x, next_y), food, walls, pathfinder)
         if dist is not None:
             # make the distance a number less than one otherwise the update
             # will diverge wildly
             features["closest-food"] = float(dist) / (walls.width * walls.height)
         features.divideAll(10.0)
         return features
+
+    def getCacheEntry(self, state):
+        """
+          The cached [info, features, featureSpace, sparse features] of
+          state, the dicts holding the actions computed so far.
+        """
+        entry = self.cache.get(state)
+        if entry is None:
+            entry = [self.getStateInfo(state), {}, None, {}]
+            self.cache.put(state, entry)
+        return entry
+
+    def getStateFeatures(self, state, actions):
+        """
+          The features are shared with the cache and must not be modified.
+        """
+        entry = self.getCacheEntry(state)
+        info, computed = entry[0], entry[1]
+        for action in actions:
+            if action not in computed:
+                computed[action] = self.computeFeatures(info, action)
+        return dict([(action, computed[action]) for action in actions])
+
+    def getSparseStateFeatures(self, state, actions, featureSpace):
+        entry = self.getCacheEntry(state)
+        if entry[2] is not featureSpace:
+            entry[2] = featureSpace
+            entry[3] = {}
+        sparse = entry[3]
+        missing = [action for action in actions if action not in sparse]
+        if missing:
+            for action, features in self.getStateFeatures(state, missing).items():
+                sparse[action] = featureSpace.toArrays(features)
+        return dict([(action, sparse[action]) for action in actions])
+
+    def getFeatures(self, state, action):
+        return self.getStateFeatures(state, [action])[action].copy()
+
+    def getSparseFeatures(self, state, action, featureSpace):
+        return self.getSparseStateFeatures(state, [action], featureSpace)[action]
@@ -33,6 +33,18 @@ class Gridworld(mdp.MarkovDecisionProcess):
         self.noise = 0.2
         # self.noise = 0
 
+        self.invalidateTables()
+
+    def invalidateTables(self):
+        """
+        Drop the memoized transition and reward tables and the CompiledMDP
+        of compiledMdp.compileMdp; they are rebuilt when next needed.  Call
+        this after editing self.grid.
+        """
+        self.transitionTable = None
+        self.rewardTable = None
+        self.compiled = None
+
     def setLivingReward(self, reward):
         """
         The (negative) reward for exiting "normal" states.
@@ -42,12 +54,14 @@ class Gridworld(mdp.MarkovDecisionProcess):
         future rewards.
         """
         self.livingReward = reward
+        self.invalidateTables()
 
     def setNoise(self, noise):
         """
         The probability of moving in an unintended direction.
         """
         self.noise = noise
+        self.invalidateTables()
 
 
     def getPossibleActions(self, state):
@@ -92,6 +106,14 @@ class Gridworld(mdp.MarkovDecisionProcess):
         departed (as in the R+N book examples, which more or
         less use this convention).
         """
+        if self.rewardTable is None:
+            self.buildTables()
+        reward = self.rewardTable.get(state)
+        if reward is not None:
+            return reward
+        return self.__computeReward(state)
+
+    def __computeReward(self, state):
         if state == self.grid.terminalState:
             return 0.0
         x, y = state
@@ -124,8 +146,31 @@ class Gridworld(mdp.MarkovDecisionProcess):
         representing the states reachable
         from 'state' by taking 'action' along
         with their transition probabilities.
-        """
 
+        The pairs come from a table of every state and action, built
+        on the first call, and are shared immutable tuples.
+        """
+        if self.transitionTable is None:
+            self.buildTables()
+        transitions = self.transitionTable.get((state, action))
+        if transitions is not None:
+            return transitions
+        return tuple(self.__computeTransitionStatesAndProbs(state, action))
+
+    def buildTables(self):
+        """
+        Precompute the transitions of every state and action and the reward
+        of every state, until the next invalidateTables.
+        """
+        transitionTable, rewardTable = {}, {}
+        for state in self.getStates():
+            rewardTable[state] = self.__computeReward(state)
+            for action in self.getPossibleActions(state):
+                transitionTable[(state, action)] = tuple(
+                    self.__computeTransitionStatesAndProbs(state, action))
+        self.transitionTable, self.rewardTable = transitionTable, rewardTable
+
+    def __computeTransitionStatesAndProbs(self, state, action):
         if action not in self.getPossibleActions(state):
             raise Exception("Illegal action!")
 
@@ -318,6 +363,21 @@ def getMazeGrid():
             ['S',' ',' ',' ']]
     return Gridworld(grid)
 
+def getLargeGrid(width=320, height=320, wallDensity=0.2, seed=0):
+    """
+    A width x height room (about 10^5 cells by default) with walls on a
+    random fraction wallDensity of the cells.  Pacman starts in the bottom
+    left corner; the top right corner is an exit worth +1 and the cell
+    below it one worth -1.  Meant for timing solvers, e.g. with -q.
+    """
+    rand = random.Random(seed)
+    grid = [['#' if rand.random() < wallDensity else ' ' for x in range(width)]
+            for y in range(height)]
+    grid[-1][0] = 'S'
+    grid[0][-1] = 1
+    grid[1][-1] = -1
+    return Gridworld(grid)
+
 
 
 def getUserAction(state, actionFunction):
@@ -405,6 +465,15 @@ def parseOptions():
     optParser.add_option('-i', '--iterations',action='store',
                          type='int',dest='iters',default=10,
                          metavar="K", help='Number of rounds of value iteration (default %default)')
+    optParser.add_option('--tolerance',action='store',
+                         type='float',dest='tolerance',default=0.0,
+                         metavar="T", help='Stop value iteration once no value changes by more than T (default %default)')
+    optParser.add_option('--theta',action='store',
+                         type='float',dest='theta',default=1e-5,
+                         metavar="T", help='Smallest change that requeues a state in prioritized sweeping (default %default)')
+    optParser.add_option('--evaluationSteps',action='store',
+                         type='int',dest='evaluationSteps',default=20,
+                         metavar="K", help='Backups per policy evaluation in policy iteration; exactpolicy solves exactly (default %default)')
     optParser.add_option('-k', '--episodes',action='store',
                          type='int',dest='episodes',default=1,
                          metavar="K", help='Number of epsiodes of the MDP to run (default %default)')
@@ -415,7 +484,7 @@ def parseOptions():
                          help='Request a window width of X pixels *per grid cell* (default %default)')
     optParser.add_option('-a', '--agent',action='store', metavar="A",
                          type='string',dest='agent',default="random",
-                         help='Agent type (options are \'random\', \'value\', \'q\', and \'learn\', default %default)')
+                         help='Agent type (options are \'random\', \'value\', \'compiledvalue\', \'policy\', \'exactpolicy\', \'q\', and \'learn\', default %default)')
     optParser.add_option('-t', '--text',action='store_true',
                          dest='textDisplay',default=False,
                          help='Use text-only ASCII display')
@@ -490,6 +559,15 @@ if __name__ == '__main__':
     a = None
     if opts.agent == 'value':
         a = valueIterationAgents.ValueIterationAgent(mdp, opts.discount, opts.iters)
+    elif opts.agent == 'compiledvalue':
+        import compiledMdp
+        a = compiledMdp.CompiledValueIterationAgent(mdp, opts.discount, opts.iters, opts.tolerance)
+        print("VALUE ITERATION RAN "+str(a.sweeps)+" SWEEPS")
+    elif opts.agent in ('policy', 'exactpolicy'):
+        evaluationSteps = opts.evaluationSteps
+        if opts.agent == 'exactpolicy': evaluationSteps = None
+        a = valueIterationAgents.PolicyIterationAgent(mdp, opts.discount, opts.iters, evaluationSteps, max(opts.tolerance, 1e-10))
+        print("POLICY ITERATION RAN "+str(a.policyIterations)+" ITERATIONS IN %.3f SECONDS" % a.seconds)
     elif opts.agent == 'learn':
         print("HERE")
         gridWorldEnv = GridworldEnvironment(mdp)
@@ -527,9 +605,11 @@ if __name__ == '__main__':
                 pass
         a = RandomAgent()
     elif opts.agent == 'asynchvalue':
-        a = valueIterationAgents.AsynchronousValueIterationAgent(mdp, opts.discount, opts.iters)
+        a = valueIterationAgents.AsynchronousValueIterationAgent(mdp, opts.discount, opts.iters, opts.tolerance)
+        print("VALUE ITERATION RAN "+str(a.backups)+" BACKUPS")
     elif opts.agent == 'priosweepvalue':
-        a = valueIterationAgents.PrioritizedSweepingValueIterationAgent(mdp, opts.discount, opts.iters)
+        a = valueIterationAgents.PrioritizedSweepingValueIterationAgent(mdp, opts.discount, opts.iters, opts.theta)
+        print("PRIORITIZED SWEEPING RAN "+str(a.backups)+" BACKUPS FOR "+str(a.updates)+" UPDATES")
     else:
         if not opts.manual: raise Exception('Unknown agent type: '+opts.agent)
 
@@ -539,7 +619,7 @@ if __name__ == '__main__':
     ###########################
     # DISPLAY Q/V VALUES BEFORE SIMULATION OF EPISODES
     try:
-        if not opts.manual and opts.agent in ('value', 'asynchvalue', 'priosweepvalue', 'learn'):
+        if not opts.manual and opts.agent in ('value', 'compiledvalue', 'policy', 'exactpolicy', 'asynchvalue', 'priosweepvalue', 'learn'):
             if opts.valueSteps:
                 for i in range(opts.iters):
                     tempAgent = valueIterationAgents.ValueIterationAgent(mdp, opts.discount, i)
@@ -561,7 +641,7 @@ if __name__ == '__main__':
         if opts.manual and opts.agent == None:
             displayCallback = lambda state: display.displayNullValues(state)
         else:
-            if opts.agent in ('random', 'value', 'asynchvalue', 'priosweepvalue'):
+            if opts.agent in ('random', 'value', 'compiledvalue', 'policy', 'exactpolicy', 'asynchvalue', 'priosweepvalue'):
                 displayCallback = lambda state: display.displayValues(a, state, "CURRENT VALUES")
             if opts.agent == 'q': displayCallback = lambda state: display.displayQValues(a, state, "CURRENT Q-VALUES")
 
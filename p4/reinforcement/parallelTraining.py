@@ -0,0 +1,310 @@
+# parallelTraining.py
+# -------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Training a Pacman Q-learning agent in several processes at once.
+
+Training goes in rounds.  In every round each of numWorkers workers copies
+the coordinator's parameters into a fresh agent, plays episodesPerRound
+headless training games with its own exploration rate, and sends back how
+its parameters changed.  The coordinator adds to each parameter the mean of
+the changes of the workers that changed it, and the next round starts from
+the result.  Parameters are ApproximateQAgent weights, keyed by feature, or
+QLearningAgent Q-values, keyed by (state, action); keys rather than array
+positions travel, since every process interns features in its own order.
+With featureDimension=<n> the weights are keyed by their hashed index,
+which HashedFeatureSpace maps back to the same slot in every process.
+
+Worker k explores with epsilon ** (1 + spread * k / (numWorkers - 1)), so
+worker 0 uses the agent's epsilon and the others less.  Every game's
+randomness is seeded from (seed, round, worker) alone, so the result does
+not depend on which process plays what.  After every round the pool plays
+greedy test games, and training stops once they reach --targetWinRate.
+
+python parallelTraining.py -p ApproximateQAgent -a extractor=SimpleExtractor -l smallClassic -j 4 -e 10 -r 10
+"""
+
+import contextlib
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import layout
+import pacman
+import textDisplay
+from ghostAgents import RandomGhost
+from qlearningAgents import ApproximateQAgent
+
+
+def getStreamSeed(seed, roundNumber, workerNumber):
+    """
+    The seed of one worker's games in one round.  String seeds are hashed the
+    same way in every process.
+    """
+    return '%s/%d/%d' % (seed, roundNumber, workerNumber)
+
+
+def getWorkerEpsilon(epsilon, workerNumber, numWorkers, spread=1.0):
+    if numWorkers < 2:
+        return epsilon
+    return epsilon ** (1 + spread * workerNumber / float(numWorkers - 1))
+
+
+def getParameters(agent):
+    """
+    A dict of the agent's parameters: weights by feature (by index in a
+    hashed feature space) for an ApproximateQAgent, Q-values by (state,
+    action) for a QLearningAgent.  setParameters loads it back unchanged.
+    """
+    if isinstance(agent, ApproximateQAgent):
+        return dict(agent.getWeights())
+    return dict(agent.qValues.items())
+
+
+def setParameters(agent, parameters):
+    if isinstance(agent, ApproximateQAgent):
+        agent.setWeights(parameters)
+    else:
+        for (state, action), value in parameters.items():
+            agent.qValues.setQValue(state, action, value, agent.actionFn)
+
+
+def getDeltas(before, after):
+    """
+    after - before for the parameters that changed, missing ones counting
+    as 0.
+    """
+    deltas = {}
+    for key, value in after.items():
+        delta = value - before.get(key, 0.0)
+        if delta != 0.0:
+            deltas[key] = delta
+    return deltas
+
+
+def mergeDeltas(parameters, allDeltas):
+    """
+    Add to every parameter the mean of the deltas given for it, averaging
+    only over the workers that changed it: a Q-table entry one worker
+    visited is not pulled back toward 0 by the workers that did not.
+    """
+    sums = {}
+    counts = {}
+    for deltas in allDeltas:
+        for key, delta in deltas.items():
+            sums[key] = sums.get(key, 0.0) + delta
+            counts[key] = counts.get(key, 0) + 1
+    for key, total in sums.items():
+        parameters[key] = parameters.get(key, 0.0) + total / counts[key]
+    return parameters
+
+
+def playEpisodes(task):
+    """
+    Play numEpisodes games with a fresh agent holding parameters.  Training
+    games explore with epsilon and learn; test games do neither.  Returns
+    (workerNumber, deltas or None, scores, wins, seconds).
+    """
+    (layoutName, pacmanType, agentArgs, parameters, training, epsilon, numEpisodes,
+     horizon, seed, roundNumber, workerNumber) = task
+    start = time.perf_counter()
+    random.seed(getStreamSeed(seed, roundNumber, workerNumber))
+    lay = layout.getLayout(layoutName)
+    args = dict(agentArgs)
+    args['numTraining'] = numEpisodes if training else 0
+    agentType = pacman.loadAgent(pacmanType, True)
+    # The agents report their training progress on stdout
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        agent = agentType(**args)
+        setParameters(agent, parameters)
+        before = getParameters(agent) if training else None
+        agent.epsilon = epsilon if training else 0.0
+        if not training:
+            agent.alpha = 0.0
+        ghosts = [RandomGhost(i + 1) for i in range(lay.getNumGhosts())]
+        rules = pacman.ClassicGameRules()
+        scores = []
+        wins = []
+        for episode in range(numEpisodes):
+            game = rules.newGame(lay, horizon, agent, ghosts, textDisplay.NullGraphics(), True)
+            game.run()
+            scores.append(game.state.getScore())
+            wins.append(game.state.isWin())
+    deltas = getDeltas(before, getParameters(agent)) if training else None
+    return workerNumber, deltas, scores, wins, time.perf_counter() - start
+
+
+class ParallelTrainer:
+    """
+    The coordinator: holds the parameters and runs the rounds in a process
+    pool of numWorkers (in this process if numWorkers is 1).
+    """
+
+    def __init__(self, layoutName, pacmanType='ApproximateQAgent', agentArgs={}, numWorkers=None,
+                 episodesPerRound=10, epsilonSpread=1.0, horizon=-1, seed=0):
+        self.layoutName = layoutName
+        self.pacmanType = pacmanType
+        self.agentArgs = agentArgs
+        self.numWorkers = numWorkers or multiprocessing.cpu_count()
+        self.episodesPerRound = episodesPerRound
+        self.epsilonSpread = epsilonSpread
+        self.horizon = horizon
+        self.seed = seed
+        self.agent = self.makeAgent()
+        self.parameters = getParameters(self.agent)
+        self.epsilon = self.agent.epsilon
+        self.roundsSoFar = 0
+        self.episodesSoFar = 0
+        self.pool = None
+
+    def makeAgent(self):
+        args = dict(self.agentArgs)
+        args['numTraining'] = 0
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return pacman.loadAgent(self.pacmanType, True)(**args)
+
+    def map(self, tasks):
+        if self.numWorkers == 1:
+            return list(map(playEpisodes, tasks))
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.numWorkers, layout.prewarmLayouts,
+                                             ([self.layoutName],))
+        return self.pool.map(playEpisodes, tasks)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def trainRound(self):
+        """
+        One round of training on every worker, merged into the parameters.
+        Returns the training games' (scores, wins).
+        """
+        tasks = [(self.layoutName, self.pacmanType, self.agentArgs, self.parameters, True,
+                  getWorkerEpsilon(self.epsilon, k, self.numWorkers, self.epsilonSpread),
+                  self.episodesPerRound, self.horizon, self.seed, self.roundsSoFar, k)
+                 for k in range(self.numWorkers)]
+        results = sorted(self.map(tasks))
+        mergeDeltas(self.parameters, [deltas for k, deltas, scores, wins, seconds in results])
+        self.roundsSoFar += 1
+        self.episodesSoFar += self.numWorkers * self.episodesPerRound
+        return (sum([scores for k, deltas, scores, wins, seconds in results], []),
+                sum([wins for k, deltas, scores, wins, seconds in results], []))
+
+    def test(self, numGames):
+        """
+        Play numGames greedy games with the current parameters, split over
+        the workers.  Returns their (scores, wins).
+        """
+        shares = [numGames // self.numWorkers + int(k < numGames % self.numWorkers)
+                  for k in range(self.numWorkers)]
+        # Test games draw from streams of their own, numbered after the workers
+        tasks = [(self.layoutName, self.pacmanType, self.agentArgs, self.parameters, False, 0.0,
+                  share, self.horizon, self.seed, self.roundsSoFar, self.numWorkers + k)
+                 for k, share in enumerate(shares) if share > 0]
+        results = sorted(self.map(tasks))
+        return (sum([scores for k, deltas, scores, wins, seconds in results], []),
+                sum([wins for k, deltas, scores, wins, seconds in results], []))
+
+    def getAgent(self):
+        """
+        A fresh agent holding the current parameters, done with training.
+        """
+        agent = self.makeAgent()
+        setParameters(agent, self.parameters)
+        return agent
+
+    def train(self, numRounds, testGames=10, targetWinRate=None, out=sys.stdout):
+        """
+        Train for numRounds rounds, testing after each with testGames games,
+        and stop early once the win rate reaches targetWinRate.  Writes a
+        line per round to out and returns the seconds taken.
+        """
+        start = time.perf_counter()
+        out.write('round,episodes,seconds,trainScore,testScore,testWinRate\n')
+        try:
+            for roundNumber in range(numRounds):
+                trainScores, trainWins = self.trainRound()
+                winRate, testScore = float('nan'), float('nan')
+                if testGames > 0:
+                    testScores, testWins = self.test(testGames)
+                    winRate = testWins.count(True) / float(len(testWins))
+                    testScore = sum(testScores) / float(len(testScores))
+                out.write('%d,%d,%.2f,%.1f,%.1f,%.2f\n'
+                          % (self.roundsSoFar, self.episodesSoFar, time.perf_counter() - start,
+                             sum(trainScores) / float(len(trainScores)), testScore, winRate))
+                out.flush()
+                if targetWinRate is not None and winRate >= targetWinRate:
+                    break
+        finally:
+            self.close()
+        return time.perf_counter() - start
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python parallelTraining.py <options>
+    EXAMPLE:    python parallelTraining.py -p PacmanQAgent -l smallGrid -j 4 -e 50 -r 10
+                  - trains a Q-table on smallGrid in 4 processes, 50 games each per round
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-l', '--layout', dest='layout', default='smallClassic',
+                      help='layout to train on [Default: %default]')
+    parser.add_option('-p', '--pacman', dest='pacman', default='ApproximateQAgent',
+                      help='learning agent, a QLearningAgent or ApproximateQAgent [Default: %default]')
+    parser.add_option('-a', '--agentArgs', dest='agentArgs', default=None,
+                      help='comma separated arguments for the agent, e.g. "extractor=SimpleExtractor"')
+    parser.add_option('-j', '--workers', type='int', dest='numWorkers', default=None,
+                      help='number of worker processes; all cores if omitted')
+    parser.add_option('-e', '--episodesPerRound', type='int', dest='episodesPerRound', default=10,
+                      help='training games per worker per round [Default: %default]')
+    parser.add_option('-r', '--rounds', type='int', dest='numRounds', default=10,
+                      help='most rounds to train [Default: %default]')
+    parser.add_option('-t', '--testGames', type='int', dest='testGames', default=10,
+                      help='greedy games played after each round [Default: %default]')
+    parser.add_option('-w', '--targetWinRate', type='float', dest='targetWinRate', default=None,
+                      help='stop once the test games win this often')
+    parser.add_option('--epsilonSpread', type='float', dest='epsilonSpread', default=1.0,
+                      help='worker k explores with epsilon**(1+spread*k/(workers-1)) [Default: %default]')
+    parser.add_option('--horizon', type='int', dest='horizon', default=-1,
+                      help='moves before a game ends; unlimited if negative [Default: %default]')
+    parser.add_option('-s', '--seed', dest='seed', default='0',
+                      help='seed of the whole run [Default: %default]')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='file to save the weights (weightsFile=) or Q-table (qValuesFile=) to')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    trainer = ParallelTrainer(options.layout, options.pacman, pacman.parseAgentArgs(options.agentArgs),
+                              options.numWorkers, options.episodesPerRound, options.epsilonSpread,
+                              options.horizon, options.seed)
+    seconds = trainer.train(options.numRounds, options.testGames, options.targetWinRate)
+    print('%d training episodes on %d workers in %.2f seconds'
+          % (trainer.episodesSoFar, trainer.numWorkers, seconds))
+    if options.output is not None:
+        agent = trainer.getAgent()
+        if isinstance(agent, ApproximateQAgent):
+            agent.saveWeights(options.output)
+        else:
+            agent.saveQValues(options.output)
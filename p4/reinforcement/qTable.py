@@ -0,0 +1,182 @@
+# qTable.py
+# ---------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+A Q-table kept in a dense NumPy array, for QLearningAgent.
+
+Every state is interned to a row number the first time the agent needs its
+value, and every action to a column number.  The row records the state's
+legal actions, so the agent asks for them only once per state, and the best
+value or action of a state is a max or argmax over its legal columns.
+getValues and getPolicies do the same for every state at once, and save and
+load move the whole table to and from a .npy file.
+"""
+
+import pickle
+
+import numpy as np
+
+
+class ArrayQTable:
+    """
+    Q-values with a row per state and a column per action, all 0 until set.
+    The array grows by doubling as states and actions are added.
+    """
+
+    def __init__(self, capacity=1024):
+        self.stateIndex = {}
+        self.states = []
+        self.legalActions = []
+        self.legalColumns = []
+        self.actionIndex = {}
+        self.actions = []
+        self.values = np.zeros((capacity, 4))
+
+    def __len__(self):
+        return len(self.states)
+
+    def addAction(self, action):
+        column = self.actionIndex.get(action)
+        if column is None:
+            column = len(self.actions)
+            if column == self.values.shape[1]:
+                self.values = np.hstack([self.values, np.zeros_like(self.values)])
+            self.actionIndex[action] = column
+            self.actions.append(action)
+        return column
+
+    def getRow(self, state, actionFn):
+        """
+        The row of state, added with the legal actions actionFn(state) if the
+        state is new.
+        """
+        row = self.stateIndex.get(state)
+        if row is None:
+            row = len(self.states)
+            if row == self.values.shape[0]:
+                self.values = np.vstack([self.values, np.zeros_like(self.values)])
+            legalActions = tuple(actionFn(state))
+            self.stateIndex[state] = row
+            self.states.append(state)
+            self.legalActions.append(legalActions)
+            self.legalColumns.append(np.array([self.addAction(a) for a in legalActions],
+                                              dtype=np.intp))
+        return row
+
+    def getLegalActions(self, state, actionFn):
+        return self.legalActions[self.getRow(state, actionFn)]
+
+    def items(self):
+        """
+        The ((state, action), Q-value) pairs of every legal action of every
+        state, in row order.
+        """
+        for row, state in enumerate(self.states):
+            for action, column in zip(self.legalActions[row], self.legalColumns[row]):
+                yield (state, action), float(self.values[row, column])
+
+    def getQValue(self, state, action):
+        """
+        Q(state, action), 0.0 for states and actions never added.
+        """
+        row = self.stateIndex.get(state)
+        column = self.actionIndex.get(action)
+        if row is None or column is None:
+            return 0.0
+        return float(self.values[row, column])
+
+    def setQValue(self, state, action, value, actionFn):
+        # Adding the row or column may replace self.values
+        row, column = self.getRow(state, actionFn), self.addAction(action)
+        self.values[row, column] = value
+
+    def getValue(self, state, actionFn):
+        """
+        The best Q-value over the legal actions of state, 0.0 if it has none.
+        """
+        row = self.getRow(state, actionFn)
+        columns = self.legalColumns[row]
+        if len(columns) == 0:
+            return 0.0
+        return float(self.values[row, columns].max())
+
+    def getPolicy(self, state, actionFn):
+        """
+        The legal action of state with the best Q-value, None if it has
+        none.  Ties go to the first in the order actionFn listed them.
+        """
+        row = self.getRow(state, actionFn)
+        columns = self.legalColumns[row]
+        if len(columns) == 0:
+            return None
+        return self.legalActions[row][self.values[row, columns].argmax()]
+
+    def getLegalMask(self):
+        """
+        The (states, actions) boolean array of legal actions.
+        """
+        mask = np.zeros((len(self.states), len(self.actions)), dtype=bool)
+        for row, columns in enumerate(self.legalColumns):
+            mask[row, columns] = True
+        return mask
+
+    def getValues(self):
+        """
+        The best Q-value of every state in row order, 0 for states without
+        legal actions.
+        """
+        mask = self.getLegalMask()
+        values = np.where(mask, self.values[:len(self.states), :len(self.actions)], -np.inf)
+        return np.where(mask.any(axis=1), values.max(axis=1, initial=-np.inf), 0.0)
+
+    def getPolicies(self):
+        """
+        The column of the best legal action of every state in row order, -1
+        for states without legal actions.  Ties go to the lowest column.
+        """
+        mask = self.getLegalMask()
+        values = np.where(mask, self.values[:len(self.states), :len(self.actions)], -np.inf)
+        if values.shape[1] == 0:
+            return np.full(len(self.states), -1, dtype=np.intp)
+        return np.where(mask.any(axis=1), values.argmax(axis=1), -1)
+
+    def save(self, fileName):
+        """
+        Write the Q-values to fileName as a (states, actions) .npy array, and
+        the states, actions and legal actions that index it, pickled, to
+        fileName + '.keys'.  '.npy' is added to fileName if missing.
+        """
+        if not fileName.endswith('.npy'): fileName += '.npy'
+        np.save(fileName, self.values[:len(self.states), :len(self.actions)])
+        f = open(fileName + '.keys', 'wb')
+        try: pickle.dump((self.states, self.actions, self.legalActions), f)
+        finally: f.close()
+
+    @staticmethod
+    def load(fileName):
+        """
+        Read a table written by save.
+        """
+        if not fileName.endswith('.npy'): fileName += '.npy'
+        values = np.load(fileName)
+        f = open(fileName + '.keys', 'rb')
+        try: states, actions, legalActions = pickle.load(f)
+        finally: f.close()
+        table = ArrayQTable(max(len(states), 1))
+        for action in actions:
+            table.addAction(action)
+        for state, legal in zip(states, legalActions):
+            table.getRow(state, lambda s: legal)
+        table.values[:len(states), :len(actions)] = values
+        return table
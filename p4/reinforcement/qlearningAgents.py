@@ -15,11 +15,16 @@
 from game import *
 from learningAgents import ReinforcementAgent
 from featureExtractors import *
+from qTable import ArrayQTable
 
 import gridworld
 
 import random,util,math
 import copy
+import pickle
+
+import numpy as np
+import replayBuffer
 
 class QLearningAgent(ReinforcementAgent):
     """
@@ -37,12 +42,20 @@ class QLearningAgent(ReinforcementAgent):
       Functions you should use
         - self.getLegalActions(state)
           which returns legal actions for a state
+
+      The Q-values live in a qTable.ArrayQTable, which also remembers
+      the legal actions of every state it has seen.  Pass
+      qValuesFile=<file.npy> to start from a table written by
+      saveQValues.
     """
-    def __init__(self, **args):
+    def __init__(self, qValuesFile=None, **args):
         "You can initialize Q-values here..."
         ReinforcementAgent.__init__(self, **args)
 
-        self.values = util.Counter()
+        if qValuesFile:
+          self.qValues = ArrayQTable.load(qValuesFile)
+        else:
+          self.qValues = ArrayQTable()
 
     def getQValue(self, state, action):
         """
@@ -50,7 +63,14 @@ class QLearningAgent(ReinforcementAgent):
           Should return 0.0 if we have never seen a state
           or the Q node value otherwise
         """
-        return self.values[(state, action)]
+        return self.qValues.getQValue(state, action)
+
+    def getLegalActions(self, state):
+        return self.qValues.getLegalActions(state, self.actionFn)
+
+    def saveQValues(self, fileName):
+        "Write the Q-table to fileName (.npy) for qValuesFile to load"
+        self.qValues.save(fileName)
 
     def computeValueFromQValues(self, state):
         """
@@ -59,13 +79,7 @@ class QLearningAgent(ReinforcementAgent):
           there are no legal actions, which is the case at the
           terminal state, you should return a value of 0.0.
         """
-        if len(self.getLegalActions(state))==0:
-          return 0.0
-        
-        val = util.Counter()
-        for action in self.getLegalActions(state):
-          val[action] = self.getQValue(state, action)
-        return val[val.argMax()] 
+        return self.qValues.getValue(state, self.actionFn)
 
     def computeActionFromQValues(self, state):
         """
@@ -73,14 +87,7 @@ class QLearningAgent(ReinforcementAgent):
           are no legal actions, which is the case at the terminal state,
           you should return None.
         """
-        val = float('-inf')
-        best = None
-        
-        for action in self.getLegalActions(state):
-          if val < self.values[(state, action)]:
-            val = self.values[(state, action)]
-            best = action
-        return best
+        return self.qValues.getPolicy(state, self.actionFn)
 
     def getAction(self, state):
         """
@@ -113,10 +120,11 @@ class QLearningAgent(ReinforcementAgent):
         """
         if nextState:
           # old + reward + next
-          self.values[(state, action)] = ((1 - self.alpha) * self.getQValue(state, action)) + (self.alpha * reward) + (self.alpha * self.discount * self.getValue(nextState))
+          value = ((1 - self.alpha) * self.getQValue(state, action)) + (self.alpha * reward) + (self.alpha * self.discount * self.getValue(nextState))
         else:
           # old + reward
-          self.values[(state, action)] = ((1 - self.alpha) * self.getQValue(state, action)) + (self.alpha * reward)
+          value = ((1 - self.alpha) * self.getQValue(state, action)) + (self.alpha * reward)
+        self.qValues.setQValue(state, action, value, self.actionFn)
           
 
     def getPolicy(self, state):
@@ -162,32 +170,127 @@ class ApproximateQAgent(PacmanQAgent):
        You should only have to overwrite getQValue
        and update.  All other QLearningAgent functions
        should work as is.
+
+       The features live in a featureExtractors.FeatureSpace, or with
+       featureDimension=<n> a HashedFeatureSpace of n features, and the
+       weights in a NumPy array over it.  weightsFile=<file> starts from
+       weights written by saveWeights (or replayBuffer.py).
     """
-    def __init__(self, extractor='IdentityExtractor', **args):
+    def __init__(self, extractor='IdentityExtractor', featureDimension=0, weightsFile=None, **args):
         self.featExtractor = util.lookup(extractor, globals())()
         PacmanQAgent.__init__(self, **args)
-        self.weights = util.Counter()
+        self.featureSpace = getFeatureSpace(featureDimension)
+        self.weightVector = np.zeros(16)
+        # Which weights have been used, for getWeights to list like a Counter
+        self.weightsSet = np.zeros(16, dtype=bool)
+        if weightsFile:
+            f = open(weightsFile, 'rb')
+            try: self.setWeights(pickle.load(f))
+            finally: f.close()
 
     def getWeights(self):
-        return self.weights
+        weights = util.Counter()
+        for i in np.flatnonzero(self.weightsSet):
+            weights[self.featureSpace.getName(i)] = float(self.weightVector[i])
+        return weights
+
+    def setWeights(self, weights):
+        "Set the weights of the features in a dict from feature to weight"
+        for name, weight in weights.items():
+            index = self.featureSpace.getIndex(name)
+            self.growWeights()
+            self.weightVector[index] = weight
+            self.weightsSet[index] = True
+
+    def saveWeights(self, fileName):
+        "Pickle getWeights() to fileName for weightsFile to load"
+        f = open(fileName, 'wb')
+        try: pickle.dump(dict(self.getWeights()), f)
+        finally: f.close()
+
+    def getFeatureArrays(self, state, action):
+        """
+          The sparse features of (state, action), with the weight vector
+          grown to cover them.
+        """
+        features = self.featExtractor.getSparseFeatures(state, action, self.featureSpace)
+        self.growWeights()
+        return features
+
+    def getStateFeatureArrays(self, state):
+        """
+          A dict from the legal actions of state to their sparse features,
+          extracted in one call so that the extractor can share the work
+          between them.
+        """
+        features = self.featExtractor.getSparseStateFeatures(
+            state, self.getLegalActions(state), self.featureSpace)
+        self.growWeights()
+        return features
+
+    def growWeights(self):
+        size = len(self.featureSpace)
+        if size > len(self.weightVector):
+            size = max(size, 2 * len(self.weightVector))
+            self.weightVector = np.concatenate([self.weightVector, np.zeros(size - len(self.weightVector))])
+            self.weightsSet = np.concatenate([self.weightsSet, np.zeros(size - len(self.weightsSet), dtype=bool)])
+
+    def dot(self, features):
+        "w * featureVector, summed in feature order"
+        indices, values = features
+        self.weightsSet[indices] = True
+        return float((self.weightVector[indices] * values).sum())
+
+    def addToWeights(self, features, scale):
+        indices, values = features
+        np.add.at(self.weightVector, indices, values * scale)
+        self.weightsSet[indices] = True
+
+    def getLegalActions(self, state):
+        # States are not interned in the Q-table, which stays empty
+        return self.actionFn(state)
+
+    def computeValueFromQValues(self, state):
+        features = self.getStateFeatureArrays(state)
+        if len(features) == 0:
+          return 0.0
+        return max([self.dot(f) for f in features.values()])
+
+    def computeActionFromQValues(self, state):
+        return self.chooseBestAction(self.getStateFeatureArrays(state))
+
+    def chooseBestAction(self, stateFeatures):
+        """
+          The action with the highest Q-value given a dict from actions to
+          their features, ties broken randomly; None if there are none.
+        """
+        val = float('-inf')
+        best = []
+        for action, features in stateFeatures.items():
+          qValue = self.dot(features)
+          if val < qValue:
+            val = qValue
+            best = [action]
+          elif val == qValue:
+            best.append(action)
+        if len(best) == 0:
+          return None
+        return random.choice(best)
 
     def getQValue(self, state, action):
         """
           Should return Q(state,action) = w * featureVector
           where * is the dotProduct operator
         """
-        total = 0
-        for i in self.featExtractor.getFeatures(state, action):
-            total += self.featExtractor.getFeatures(state, action)[i] * self.weights[i]
-        return total
+        return self.dot(self.getFeatureArrays(state, action))
 
     def update(self, state, action, nextState, reward: float):
         """
            Should update your weights based on transition
         """
-        statediff = self.alpha * ((reward + self.discount * self.getValue(nextState)) - self.getQValue(state, action))
-        for i in self.featExtractor.getFeatures(state, action):
-            self.weights[i] += self.featExtractor.getFeatures(state, action)[i] * statediff
+        features = self.getFeatureArrays(state, action)
+        statediff = self.alpha * ((reward + self.discount * self.getValue(nextState)) - self.dot(features))
+        self.addToWeights(features, statediff)
 
     def final(self, state):
         """Called at the end of each game."""
@@ -199,3 +302,72 @@ class ApproximateQAgent(PacmanQAgent):
             # you might want to print your weights here for debugging
             "*** YOUR CODE HERE ***"
             pass
+
+class ReplayApproximateQAgent(ApproximateQAgent):
+    """
+       ApproximateQAgent with experience replay.  Every transition is
+       stored in a replayBuffer.ReplayBuffer with its features already
+       extracted, and each update is a minibatch gradient step over
+       batchSize transitions drawn from the buffer, uniformly or, with
+       prioritized=True, by TD error.
+
+       The features of every legal action of a state are extracted once:
+       the same arrays choose the action, give the next-state values of the
+       transition into the state and become the features of the transition
+       out of it.
+
+       replayFile=<file> saves the buffer when training ends, for offline
+       replay with replayBuffer.py.
+    """
+    def __init__(self, replayCapacity=10000, batchSize=32, prioritized=False,
+                 replayFile=None, **args):
+        ApproximateQAgent.__init__(self, **args)
+        self.replayBuffer = replayBuffer.ReplayBuffer(int(replayCapacity), self.featureSpace)
+        self.batchSize = int(batchSize)
+        self.prioritized = prioritized in (True, 'True', 'true', '1', 1)
+        self.replayFile = replayFile
+        self.cachedState = None
+        self.cachedFeatures = None
+
+    def getStateFeatures(self, state):
+        """
+          A dict from the legal actions of state to their sparse features,
+          remembered for the latest state asked about.
+        """
+        if self.cachedState is not state:
+            self.cachedFeatures = self.getStateFeatureArrays(state)
+            self.cachedState = state
+        return self.cachedFeatures
+
+    def getQValue(self, state, action):
+        features = self.getStateFeatures(state).get(action)
+        if features is None:
+            features = self.getFeatureArrays(state, action)
+        return self.dot(features)
+
+    def computeValueFromQValues(self, state):
+        features = self.getStateFeatures(state)
+        if len(features) == 0:
+          return 0.0
+        return max([self.dot(f) for f in features.values()])
+
+    def computeActionFromQValues(self, state):
+        return self.chooseBestAction(self.getStateFeatures(state))
+
+    def update(self, state, action, nextState, reward: float):
+        """
+           Store the transition and replay a minibatch
+        """
+        features = self.getStateFeatures(state).get(action)
+        if features is None:
+            features = self.getFeatureArrays(state, action)
+        self.replayBuffer.add(features, reward, list(self.getStateFeatures(nextState).values()))
+        if self.alpha > 0:
+            self.weightVector = self.replayBuffer.replay(
+                self.weightVector, min(self.batchSize, len(self.replayBuffer)), self.alpha,
+                self.discount, self.prioritized)
+
+    def final(self, state):
+        ApproximateQAgent.final(self, state)
+        if self.episodesSoFar == self.numTraining and self.replayFile:
+            self.replayBuffer.save(self.replayFile)
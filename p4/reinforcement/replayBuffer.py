@@ -0,0 +1,251 @@
+# replayBuffer.py
+# ---------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Experience replay for linear Q-learning (ApproximateQAgent).
+
+A ReplayBuffer keeps the last capacity transitions with their features
+already extracted, as sparse (indices, values) arrays over a FeatureSpace:
+the features of the action taken and those of every legal action of the
+next state.  Replaying a minibatch then needs no feature extractor: the
+Q-values, targets and weight gradient of the whole batch are gathers and
+np.bincount sums over the features the batch touches.  Transitions are
+drawn uniformly or in proportion to their last TD error (prioritized
+replay).
+
+A buffer saved by ReplayApproximateQAgent (replayFile=...) can be replayed
+offline into a weights file, which the agent loads with weightsFile=...:
+
+python replayBuffer.py -i replay.pkl -n 20000 -b 64 -o weights.pkl
+"""
+
+import pickle
+import sys
+
+import numpy as np
+
+from featureExtractors import FeatureSpace
+
+
+def growWeights(weights, dimension):
+    """
+    weights, extended with zeros (by doubling) to at least dimension.
+    """
+    if len(weights) >= dimension:
+        return weights
+    grown = np.zeros(max(dimension, 2 * len(weights)))
+    grown[:len(weights)] = weights
+    return grown
+
+
+class ReplayBuffer:
+    """
+    A ring buffer of the last capacity transitions.  Each holds the sparse
+    features of the action taken, the reward, and the features of every
+    legal action of the next state (none if it is terminal).
+    """
+
+    def __init__(self, capacity=10000, featureSpace=None, seed=None):
+        self.capacity = capacity
+        self.featureSpace = featureSpace if featureSpace is not None else FeatureSpace()
+        self.transitions = [None] * capacity
+        self.priorities = np.zeros(capacity)
+        self.maxPriority = 1.0
+        self.size = 0
+        self.next = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, features, reward, nextFeatures):
+        """
+        Store a transition.  features is the (indices, values) pair of the
+        action taken and nextFeatures the list of pairs of the next state's
+        legal actions.  New transitions get the largest priority so far.
+        """
+        if nextFeatures:
+            nextIndices = np.concatenate([f[0] for f in nextFeatures])
+            nextValues = np.concatenate([f[1] for f in nextFeatures])
+        else:
+            nextIndices, nextValues = np.zeros(0, dtype=np.intp), np.zeros(0)
+        nextLengths = np.array([len(f[0]) for f in nextFeatures], dtype=np.intp)
+        self.transitions[self.next] = (features[0], features[1], float(reward),
+                                       nextIndices, nextValues, nextLengths)
+        self.priorities[self.next] = self.maxPriority
+        self.next = (self.next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batchSize, prioritized=False, priorityExponent=0.6):
+        """
+        Draw batchSize slots with replacement, uniformly or in proportion to
+        priority ** priorityExponent.  Returns the slots and the probability
+        of drawing each of them.
+        """
+        if not prioritized:
+            slots = self.rng.integers(0, self.size, batchSize)
+            return slots, np.full(batchSize, 1.0 / self.size)
+        weights = self.priorities[:self.size] ** priorityExponent
+        cumulative = np.cumsum(weights)
+        slots = np.searchsorted(cumulative, self.rng.random(batchSize) * cumulative[-1], side='right')
+        slots = np.minimum(slots, self.size - 1)
+        return slots, weights[slots] / cumulative[-1]
+
+    def getBatch(self, slots):
+        """
+        Concatenate the transitions in slots into one batch: a dict of
+        arrays with segment numbers linking features to transitions, and
+        next-state features to actions and actions to transitions.
+        """
+        batch = [self.transitions[i] for i in slots]
+        size = len(batch)
+        lengths = np.array([len(t[0]) for t in batch], dtype=np.intp)
+        numActions = np.array([len(t[5]) for t in batch], dtype=np.intp)
+        actionLengths = np.concatenate([t[5] for t in batch])
+        return {
+            'size': size,
+            'indices': np.concatenate([t[0] for t in batch]),
+            'values': np.concatenate([t[1] for t in batch]),
+            'segments': np.repeat(np.arange(size), lengths),
+            'rewards': np.array([t[2] for t in batch]),
+            'nextIndices': np.concatenate([t[3] for t in batch]),
+            'nextValues': np.concatenate([t[4] for t in batch]),
+            'actionSegments': np.repeat(np.arange(len(actionLengths)), actionLengths),
+            'numActions': numActions,
+            'actionCount': len(actionLengths),
+        }
+
+    def getTDErrors(self, weights, batch, discount):
+        """
+        reward + discount * max_a' Q(s', a') - Q(s, a) for every transition
+        of a batch under the weight vector.
+        """
+        size = batch['size']
+        qValues = np.bincount(batch['segments'], weights[batch['indices']] * batch['values'],
+                              minlength=size)
+        nextQValues = np.bincount(batch['actionSegments'],
+                                  weights[batch['nextIndices']] * batch['nextValues'],
+                                  minlength=batch['actionCount'])
+        nextValues = np.zeros(size)
+        hasActions = batch['numActions'] > 0
+        if hasActions.any():
+            starts = np.concatenate([[0], np.cumsum(batch['numActions'])[:-1]])
+            nextValues[hasActions] = np.maximum.reduceat(nextQValues, starts[hasActions])
+        return batch['rewards'] + discount * nextValues - qValues
+
+    def replay(self, weights, batchSize, alpha, discount, prioritized=False,
+               priorityExponent=0.6, importanceExponent=0.4):
+        """
+        One minibatch gradient step: weights moves by alpha times the mean of
+        TD error times features over batchSize sampled transitions.  With
+        prioritized replay, each transition is weighted to undo its sampling
+        bias (importanceExponent 1 undoes it fully) and its priority is set
+        to its new TD error.  Returns the new weights.
+        """
+        weights = growWeights(weights, len(self.featureSpace))
+        slots, probs = self.sample(batchSize, prioritized, priorityExponent)
+        batch = self.getBatch(slots)
+        errors = self.getTDErrors(weights, batch, discount)
+        scale = np.full(len(slots), 1.0 / len(slots))
+        if prioritized:
+            correction = (self.size * probs) ** -importanceExponent
+            scale *= correction / correction.max()
+            self.priorities[slots] = np.abs(errors) + 1e-6
+            self.maxPriority = max(self.maxPriority, self.priorities[slots].max())
+        # Sum the gradient over the batch's own features, not the whole space
+        touched, positions = np.unique(batch['indices'], return_inverse=True)
+        gradient = np.bincount(positions, (errors * scale)[batch['segments']] * batch['values'],
+                               minlength=len(touched))
+        weights[touched] += alpha * gradient
+        return weights
+
+    def save(self, fileName):
+        f = open(fileName, 'wb')
+        try:
+            pickle.dump((self.capacity, self.featureSpace, self.transitions[:self.size]
+                         if self.size < self.capacity else self.transitions,
+                         self.priorities, self.next), f)
+        finally:
+            f.close()
+
+    @staticmethod
+    def load(fileName, seed=None):
+        f = open(fileName, 'rb')
+        try: capacity, featureSpace, transitions, priorities, next = pickle.load(f)
+        finally: f.close()
+        buffer = ReplayBuffer(capacity, featureSpace, seed)
+        buffer.transitions[:len(transitions)] = transitions
+        buffer.priorities = priorities
+        buffer.maxPriority = max(priorities.max(), 1.0) if len(priorities) else 1.0
+        buffer.size = len(transitions)
+        buffer.next = next
+        return buffer
+
+
+def trainOffline(buffer, numUpdates, batchSize=32, alpha=0.2, discount=0.8, prioritized=False,
+                 weights=None):
+    """
+    Replay numUpdates minibatches from buffer into a weight vector (zeros by
+    default) and return it.
+    """
+    if weights is None:
+        weights = np.zeros(len(buffer.featureSpace))
+    for update in range(numUpdates):
+        weights = buffer.replay(weights, batchSize, alpha, discount, prioritized)
+    return weights
+
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python replayBuffer.py <options>
+    EXAMPLE:    python replayBuffer.py -i replay.pkl -n 10000 -o weights.pkl
+                  - retrains linear Q-learning weights from a saved buffer
+    """
+    parser = OptionParser(usageStr)
+    parser.add_option('-i', '--input', dest='input', default=None,
+                      help='replay buffer saved by ReplayApproximateQAgent')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='file to pickle the weights (a dict from feature to weight) to')
+    parser.add_option('-n', '--updates', type='int', dest='numUpdates', default=10000,
+                      help='number of minibatch updates [Default: %default]')
+    parser.add_option('-b', '--batchSize', type='int', dest='batchSize', default=32,
+                      help='transitions per minibatch [Default: %default]')
+    parser.add_option('-l', '--alpha', type='float', dest='alpha', default=0.2,
+                      help='learning rate [Default: %default]')
+    parser.add_option('-d', '--discount', type='float', dest='discount', default=0.8,
+                      help='discount on future rewards [Default: %default]')
+    parser.add_option('--prioritized', action='store_true', dest='prioritized', default=False,
+                      help='draw transitions in proportion to their TD error')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0 or options.input is None:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    buffer = ReplayBuffer.load(options.input)
+    weights = trainOffline(buffer, options.numUpdates, options.batchSize, options.alpha,
+                           options.discount, options.prioritized)
+    errors = buffer.getTDErrors(weights, buffer.getBatch(np.arange(len(buffer))), options.discount)
+    print('Mean absolute TD error over %d transitions: %.4f' % (len(buffer), np.abs(errors).mean()))
+    weightDict = dict([(buffer.featureSpace.getName(i), float(weights[i]))
+                       for i in np.flatnonzero(weights)])
+    for name in sorted(weightDict, key=str):
+        print('%s: %.4f' % (name, weightDict[name]))
+    if options.output is not None:
+        f = open(options.output, 'wb')
+        try: pickle.dump(weightDict, f)
+        finally: f.close()
@@ -242,6 +242,52 @@ class PriorityQueue:
             self.push(item, priority)
 
 
+class IndexedPriorityQueue(PriorityQueue):
+    """
+    A PriorityQueue that holds each item at most once and indexes the heap
+    entries by item, so that update takes O(log n) instead of a scan of
+    the heap.  Replaced entries stay in the heap, marked as removed, and
+    are skipped by pop.  Items must be hashable.
+    """
+    REMOVED = object()
+
+    def __init__(self):
+        PriorityQueue.__init__(self)
+        self.entries = {}
+
+    def push(self, item, priority):
+        "Adds item with the given priority, replacing any entry it had"
+        if item in self.entries:
+            self.entries[item][-1] = IndexedPriorityQueue.REMOVED
+        entry = [priority, self.count, item]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
+        self.count += 1
+
+    def pop(self):
+        while self.heap:
+            priority, count, item = heapq.heappop(self.heap)
+            if item is not IndexedPriorityQueue.REMOVED:
+                del self.entries[item]
+                return item
+        raise IndexError('pop from an empty priority queue')
+
+    def isEmpty(self):
+        return len(self.entries) == 0
+
+    def update(self, item, priority):
+        # Same contract as PriorityQueue.update: only ever lowers the priority
+        entry = self.entries.get(item)
+        if entry is None or priority < entry[0]:
+            self.push(item, priority)
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
 class PriorityQueueWithFunction(PriorityQueue):
     """
     Implements a priority queue with the same push/pop signature of the
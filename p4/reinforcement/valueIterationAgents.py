@@ -30,6 +30,7 @@ import mdp, util
 
 from learningAgents import ValueEstimationAgent
 import collections
+import time
 
 class ValueIterationAgent(ValueEstimationAgent):
     """
@@ -118,3 +119,141 @@ class ValueIterationAgent(ValueEstimationAgent):
 
     def getQValue(self, state, action):
         return self.computeQValueFromValues(state, action)
+
+class AsynchronousValueIterationAgent(ValueIterationAgent):
+    """
+        * Please read learningAgents.py before reading this.*
+
+        An AsynchronousValueIterationAgent takes a Markov decision process
+        (see mdp.py) on initialization and runs cyclic (Gauss-Seidel) value
+        iteration for a given number of iterations using the supplied
+        discount factor.
+    """
+    def __init__(self, mdp: mdp.MarkovDecisionProcess, discount = 0.9, iterations = 1000, tolerance = 0.0):
+        """
+          Each iteration updates a single state in place, going through
+          mdp.getStates() in order and skipping terminal states.  The
+          iterations stop early once a full pass over the states changes no
+          value by more than tolerance.
+
+          The backups run on the compiledMdp.CompiledMDP of the mdp, and
+          self.backups counts the Bellman backups performed.
+        """
+        self.tolerance = tolerance
+        self.backups = 0
+        ValueIterationAgent.__init__(self, mdp, discount, iterations)
+
+    def runValueIteration(self):
+        import compiledMdp
+        compiled = compiledMdp.compileMdp(self.mdp)
+        numStates = compiled.numStates
+        successorLists = compiled.getSuccessorLists()
+        values = [0.0] * numStates
+        discount = self.discount
+        iteration, largestChange = 0, 0.0
+        while numStates and (self.iterations is None or self.iterations < 0 or iteration < self.iterations):
+            s = iteration % numStates
+            iteration += 1
+            if successorLists[s]:
+                value = max([reward + discount * sum([prob * values[n] for n, prob in successors])
+                             for reward, successors in successorLists[s]])
+                self.backups += 1
+                largestChange = max(largestChange, abs(value - values[s]))
+                values[s] = value
+            if s == numStates - 1:
+                if largestChange <= self.tolerance:
+                    break
+                largestChange = 0.0
+        self.values = compiled.toCounter(values)
+
+class PrioritizedSweepingValueIterationAgent(AsynchronousValueIterationAgent):
+    """
+        * Please read learningAgents.py before reading this.*
+
+        A PrioritizedSweepingValueIterationAgent takes a Markov decision process
+        (see mdp.py) on initialization and runs prioritized sweeping value iteration
+        for a given number of iterations using the supplied parameters.
+    """
+    def __init__(self, mdp, discount = 0.9, iterations = 100, theta = 1e-5):
+        """
+          Every non-terminal state starts in a priority queue, ranked by how
+          much a backup would change its value.  Each iteration pops the
+          state with the largest change and updates it; its predecessors
+          are then pushed back whenever their change exceeds theta.  The
+          iterations stop early when the queue runs empty.
+
+          self.backups counts every Bellman backup computed, including those
+          that only rank a state, and self.updates the values written.
+        """
+        self.theta = theta
+        self.updates = 0
+        AsynchronousValueIterationAgent.__init__(self, mdp, discount, iterations)
+
+    def runValueIteration(self):
+        import compiledMdp
+        compiled = compiledMdp.compileMdp(self.mdp)
+        successorLists = compiled.getSuccessorLists()
+        predecessors = compiled.getPredecessors()
+        values = [0.0] * compiled.numStates
+        discount = self.discount
+
+        def backup(s):
+            self.backups += 1
+            return max([reward + discount * sum([prob * values[n] for n, prob in successors])
+                        for reward, successors in successorLists[s]])
+
+        queue = util.IndexedPriorityQueue()
+        for s in range(compiled.numStates):
+            if successorLists[s]:
+                queue.push(s, -abs(values[s] - backup(s)))
+        iteration = 0
+        while not queue.isEmpty() and (self.iterations is None or self.iterations < 0 or iteration < self.iterations):
+            iteration += 1
+            s = queue.pop()
+            values[s] = backup(s)
+            self.updates += 1
+            for p in predecessors[s]:
+                if not successorLists[p]:
+                    continue
+                diff = abs(values[p] - backup(p))
+                if diff > self.theta:
+                    queue.update(p, -diff)
+        self.values = compiled.toCounter(values)
+
+class PolicyIterationAgent(ValueIterationAgent):
+    """
+        * Please read learningAgents.py before reading this.*
+
+        A PolicyIterationAgent takes a Markov decision process (see mdp.py)
+        on initialization and runs policy iteration on its
+        compiledMdp.CompiledMDP.  Starting from the first legal action in
+        every state, it alternates evaluating the policy and making it
+        greedy, for at most iterations rounds.
+
+        By default it runs modified policy iteration: each evaluation is
+        evaluationSteps backups under the policy, and the agent stops once a
+        greedy backup changes no value by more than tolerance.  With
+        evaluationSteps None each evaluation solves for the policy's values
+        exactly (sparse BiCGSTAB), and the agent stops when the policy no
+        longer changes; every solve takes hundreds of products at discounts
+        near 1, so this is slower than value iteration on large grids.
+
+        self.policyIterations holds the rounds run, self.evaluationSteps
+        the products with policy transition matrices and self.seconds the
+        time taken.
+    """
+    def __init__(self, mdp: mdp.MarkovDecisionProcess, discount = 0.9, iterations = 100,
+                 evaluationSteps = 20, tolerance = 1e-10):
+        self.evaluationStepsPerRound = evaluationSteps
+        self.tolerance = tolerance
+        ValueIterationAgent.__init__(self, mdp, discount, iterations)
+
+    def runValueIteration(self):
+        import compiledMdp
+        start = time.perf_counter()
+        compiled = compiledMdp.compileMdp(self.mdp)
+        values, self.policyIterations, self.evaluationSteps = compiledMdp.runPolicyIteration(
+            compiled, self.discount, self.iterations, self.evaluationStepsPerRound, self.tolerance)
+        self.sweeps = self.policyIterations
+        self.values = compiled.toCounter(values)
+        self.seconds = time.perf_counter() - start